@@ -0,0 +1,49 @@
+"""Compare plain and memoized `MimeResolver.resolve` on a bulk batch of pairs.
+
+    poetry run python benchmarks/bench_resolve.py [pairs] [cache_size]
+"""
+import mimetypes
+import random
+import sys
+import time
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+
+_config = dict(
+    binary_types=("image", "video", "audio"),
+    media_correction=("video/mp4", "video/webm", "image/jpeg"),
+)
+
+
+def make_pairs(count: int, seed: int = 0):
+    MimeType.initialize({})
+    rand = random.Random(seed)
+    vocabulary = sorted(set(mimetypes.types_map.values()))[:60]
+    mimes = [MimeType.of_str(m) for m in vocabulary] + [MimeType.Binary, MimeType.Extensionless]
+    return [
+        (rand.choice(mimes), rand.choice(mimes) if rand.random() < 0.3 else None)
+        for _ in range(count)
+    ]
+
+
+def run(resolver: MimeResolver, pairs) -> float:
+    resolve = resolver.resolve
+    start = time.perf_counter()
+    for file_mime, name_mime in pairs:
+        resolve(file_mime, file_mime if name_mime is None else name_mime)
+    return len(pairs) / (time.perf_counter() - start)
+
+
+def main(count: int = 1_000_000, cache_size: int = 4096):
+    pairs = make_pairs(count)
+    plain = run(MimeResolver(_config), pairs)
+    memoized_resolver = MimeResolver(dict(_config, cache_size=cache_size))
+    memoized = run(memoized_resolver, pairs)
+    print(f"plain:    {plain:12,.0f} pairs/s")
+    print(f"memoized: {memoized:12,.0f} pairs/s  ({memoized / plain:.1f}x)")
+    print(f"          {memoized_resolver.cache_info()}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,199 @@
+"""Throughput and memory benchmarks over a synthetic corpus.
+
+Builds a tree of configurable size and depth from the sample media files,
+then times name detection, content detection, resolution and normalization
+over it, reporting files/sec and peak traced memory per benchmark.
+
+    poetry run python benchmarks/run.py --files 20000 --depth 3
+    poetry run python benchmarks/run.py --save baseline.json
+    poetry run python benchmarks/run.py --compare baseline.json
+"""
+from pathlib import Path, PurePath
+from typing import Callable, Dict, List, Sequence, Tuple
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from horse_dance.batch import resolve_codes
+from horse_dance.bulk import SuffixTable
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.normalizer import Normalizer
+
+_sample_media = Path(__file__).parent.parent / "tests" / "file-examples" / "sample-media"
+
+_mime_config = dict(
+    preferred_ext=(dict(mime="image/jpeg", ext="jpg"),),
+    ext_optional=("text/plain",),
+)
+_resolver_config = dict(
+    binary_types=("image", "video", "audio"),
+    media_correction=("video/mp4", "video/webm", "video/x-matroska"),
+)
+_normalizer_config = dict(
+    ambiguous_stems=(dict(stem="img", suffix_digits=4), dict(stem="sample", suffix_digits=3)),
+)
+
+_stems = ("IMG_{:04d}", "Holiday Photo {}", "sample-{}", "{}", "Track {:02d} (final)")
+
+
+def make_corpus(root: Path, files: int, depth: int, fanout: int = 8, seed: int = 0) -> List[Path]:
+    """Hard-link (or copy) randomly chosen samples into a tree `depth`
+    directories deep under `root`, with varied stems and a fraction of
+    wrong or missing extensions."""
+    rand = random.Random(seed)
+    samples = sorted(p for p in _sample_media.rglob("*") if p.is_file())
+    exts = sorted({p.suffix for p in samples})
+    paths = []
+    for i in range(files):
+        parts = [f"d{rand.randrange(fanout)}" for _ in range(rand.randint(0, depth))]
+        directory = root.joinpath(*parts)
+        directory.mkdir(parents=True, exist_ok=True)
+        sample = rand.choice(samples)
+        ext = sample.suffix
+        roll = rand.random()
+        if roll < 0.1:
+            ext = rand.choice(exts)
+        elif roll < 0.15:
+            ext = ""
+        path = directory / (rand.choice(_stems).format(i) + f"-{i}" + ext)
+        try:
+            os.link(sample, path)
+        except OSError:
+            shutil.copy(sample, path)
+        paths.append(path)
+    return paths
+
+
+Bench = Tuple[str, Callable[[], list], int]
+
+
+def benchmarks(paths: Sequence[Path]) -> List[Bench]:
+    resolver = MimeResolver(_resolver_config)
+    memoized = MimeResolver(dict(_resolver_config, cache_size=4096))
+    normalizer = Normalizer(_normalizer_config)
+    pure_paths = [PurePath(p) for p in paths]
+    file_mimes = [MimeType.of_file(p) for p in paths]
+    name_mimes = [MimeType.of_name(p) for p in paths]
+    resolved = [resolver.resolve(f, n) for f, n in zip(file_mimes, name_mimes)]
+    mimes = [None if m.resolved is None else m.resolved.mime for m in resolved]
+
+    # results are kept, so that peak memory includes holding them
+    def of_name():
+        return [MimeType.of_name(p) for p in pure_paths]
+
+    str_paths = [str(p) for p in paths]
+
+    def bulk():
+        return SuffixTable().classify(str_paths)
+
+    def of_file():
+        return [MimeType.of_file(p) for p in paths]
+
+    def resolve(res: MimeResolver) -> Callable[[], list]:
+        def run():
+            return [res.resolve(f, n) for f, n in zip(file_mimes, name_mimes)]
+        return run
+
+    table: Dict[MimeType, int] = {}
+    file_codes = [table.setdefault(m, len(table)) for m in file_mimes]
+    name_codes = [table.setdefault(m, len(table)) for m in name_mimes]
+
+    def resolve_batch():
+        return resolve_codes(resolver, list(table), file_codes, name_codes)
+
+    def resolve_path():
+        return [resolver.resolve_path(p) for p in paths]
+
+    def normalize():
+        return [normalizer(p, m) for p, m in zip(pure_paths, mimes)]
+
+    def normalize_many():
+        return list(normalizer.normalize_many(pure_paths, mimes))
+
+    n = len(paths)
+    return [
+        ("MimeType.of_name", of_name, n),
+        ("SuffixTable.classify", bulk, n),
+        ("MimeType.of_file", of_file, n),
+        ("MimeResolver.resolve", resolve(resolver), n),
+        ("MimeResolver.resolve (memoized)", resolve(memoized), n),
+        ("resolve_codes", resolve_batch, n),
+        ("MimeResolver.resolve_path", resolve_path, n),
+        ("Normalizer.__call__", normalize, n),
+        ("Normalizer.normalize_many", normalize_many, n),
+    ]
+
+
+def measure(fn: Callable[[], list], count: int, repeat: int) -> Dict[str, float]:
+    best = min(_timed(fn) for _ in range(repeat))
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return dict(files_per_sec=count / best, peak_kib=peak / 1024)
+
+
+def _timed(fn: Callable[[], list]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> bool:
+    """Print results, against the baseline if given. False if any benchmark
+    ran slower than the baseline by more than `tolerance`."""
+    ok = True
+    print(f"{'benchmark':34} {'files/s':>14} {'peak KiB':>10}" + ("  vs baseline" if baseline else ""))
+    for name, result in results.items():
+        line = f"{name:34} {result['files_per_sec']:14,.0f} {result['peak_kib']:10,.0f}"
+        base = baseline.get(name)
+        if base is not None:
+            ratio = result['files_per_sec'] / base['files_per_sec']
+            slower = ratio < 1 - tolerance
+            ok = ok and not slower
+            line += f"  {ratio:6.2f}x{'  REGRESSION' if slower else ''}"
+        print(line)
+    return ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", help="run benchmarks whose name contains this")
+    parser.add_argument("--save", type=Path, help="store results as a baseline")
+    parser.add_argument("--compare", type=Path, help="compare against a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    MimeType.initialize(_mime_config)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(Path(tmp), args.files, args.depth, seed=args.seed)
+        results = {
+            name: measure(fn, count, args.repeat)
+            for name, fn, count in benchmarks(paths)
+            if args.only is None or args.only in name
+        }
+
+    baseline = {}
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())["results"]
+    ok = report(results, baseline, args.tolerance)
+    if args.save is not None:
+        args.save.write_text(json.dumps(dict(
+            files=args.files, depth=args.depth, python=sys.version.split()[0], results=results
+        ), indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Mime resolution from asyncio code without blocking the event loop."""
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from pathlib import Path, PurePath
+from typing import AsyncIterable, AsyncIterator, Deque, Optional, Tuple
+import asyncio
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver, Mimes
+from horse_dance.scanner import walk
+
+
+class AsyncMimeResolver:
+    """Runs the filesystem and libmagic work of a `MimeResolver` on an
+    executor (the loop's default one if not given), with at most `limit`
+    detections in flight. Cancelling an awaiting task cancels its queued
+    work; work already running finishes in the background.
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[MimeResolver] = None,
+        executor: Optional[Executor] = None,
+        limit: int = 16,
+        listing_batch: int = 256,
+    ):
+        self.resolver = MimeResolver() if resolver is None else resolver
+        self.executor = executor
+        self.limit = limit
+        self.listing_batch = listing_batch
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _limiter(self) -> asyncio.Semaphore:
+        # created on first use so that it binds to the running loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    async def _run(self, fn, *args):
+        async with self._limiter():
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def resolve_path(self, path: PurePath, ignore_file: bool = False) -> Mimes:
+        return await self._run(self.resolver.resolve_path, path, ignore_file)
+
+    async def resolve_buffer(self, data: bytes, path: PurePath) -> Mimes:
+        """Resolve `data`, the leading bytes of a file named `path`."""
+        file_mime = await self._run(MimeType.of_buffer, data, path)
+        return self.resolver.resolve(file_mime, MimeType.of_name(path))
+
+    async def resolve_stream(
+        self, chunks: AsyncIterable[bytes], path: PurePath, head_size: Optional[int] = None
+    ) -> Tuple[Mimes, bytes]:
+        """Resolve a file arriving as a stream of chunks, such as an upload,
+        from its first chunk, or from its first `head_size` bytes if given.
+
+        Returns the resolution and the bytes consumed to reach it; the rest of
+        the stream is left unread.
+        """
+        iterator = chunks.__aiter__()
+        head = b""
+        while True:
+            try:
+                head += await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            if head_size is None or len(head) >= head_size:
+                break
+        return await self.resolve_buffer(head, path), head
+
+    async def scan(
+        self, root: Path, follow_symlinks: bool = False
+    ) -> AsyncIterator[Tuple[Path, Mimes]]:
+        """Resolve every path under `root`, in walk order, as
+        `MimeResolver.scan` does."""
+        loop = asyncio.get_running_loop()
+        entries = walk(root, follow_symlinks=follow_symlinks)
+        pending: Deque[Tuple[Path, asyncio.Future]] = deque()
+        try:
+            while True:
+                batch = await loop.run_in_executor(
+                    self.executor, list, islice(entries, self.listing_batch)
+                )
+                for entry in batch:
+                    pending.append((entry[0], loop.run_in_executor(
+                        self.executor, self.resolver.resolve_file, *entry
+                    )))
+                    while len(pending) >= self.limit:
+                        path, future = pending.popleft()
+                        yield path, await future
+                if not batch:
+                    break
+            while pending:
+                path, future = pending.popleft()
+                yield path, await future
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,235 @@
+"""Resolution of many mime pairs at once, given as integer codes.
+
+Pairs are two columns of codes into a table of mimes, as `ScanResults`
+keeps them. Every rule depends only on properties of each mime, or for
+`Substitute` of the pair, so these are worked out once per table entry and
+the rules applied to whole columns as masks, in the resolver's order, with
+NumPy when it is installed. Without it, each distinct pair is resolved once
+with `MimeResolver.resolve`.
+
+    mimes, resolved, rules = resolve_codes(resolver, results.mimes, results.file, results.name)
+
+Result codes index `mimes`, with -1 for unresolved pairs; rule ids index
+`results.RULES`, with -1 likewise.
+"""
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import (
+    MimeResolver, Matched, Inode, Extensionless, CorrectBinary,
+    CorrectText, Substitute, CorrectFormat, _inner_name_mime,
+)
+from horse_dance.results import RULES
+
+try:
+    import numpy  # type: ignore
+except ImportError:
+    numpy = None  # type: ignore
+
+_rule_ids = {rule: i for i, rule in enumerate(RULES)}
+
+# the rules the masks below stand for; resolvers with others go pair by pair
+_VECTORIZED = [Matched, Inode, Extensionless, CorrectBinary, CorrectText, Substitute, CorrectFormat]
+
+
+class _Table:
+    """A mime table, extended with substitution results it lacks."""
+
+    def __init__(self, mimes: Sequence[MimeType]):
+        self.mimes = list(mimes)
+        self.codes: Dict[MimeType, int] = {}
+        for i, mime in enumerate(self.mimes):
+            self.codes.setdefault(mime, i)
+
+    def code(self, mime: MimeType) -> int:
+        code = self.codes.get(mime)
+        if code is None:
+            code = self.codes[mime] = len(self.mimes)
+            self.mimes.append(mime)
+        return code
+
+
+def _check(codes, size: int):
+    if not len(codes):
+        return
+    if numpy is not None:
+        codes = numpy.asarray(codes)
+        low, high = codes.min(), codes.max()
+    else:
+        low, high = min(codes), max(codes)
+    if low < 0 or high >= size:
+        raise ValueError(f"mime codes must be within the table of {size} mimes")
+
+
+def _resolve_pairs(
+    resolver: MimeResolver, table: _Table, file, name
+) -> Tuple[array, array]:
+    known: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    resolved = array('i')
+    rules = array('b')
+    mimes = table.mimes
+    for pair in zip(file, name):
+        result = known.get(pair)
+        if result is None:
+            m = resolver.resolve(mimes[pair[0]], mimes[pair[1]]).resolved
+            if m is None:
+                result = (-1, -1)
+            else:
+                result = (table.code(m.mime), _rule_ids[type(m)])
+            known[pair] = result
+        resolved.append(result[0])
+        rules.append(result[1])
+    return resolved, rules
+
+
+class _Masks:
+    """Per mime properties of a table, for applying the rules to columns."""
+
+    def __init__(self, resolver: MimeResolver, table: _Table):
+        self.resolver = resolver
+        self.table = table
+        # compressed contents resolve on their payload, as in
+        # `MimeResolver.resolve_uncached`, so payload mimes get codes too
+        for mime in list(table.mimes):
+            table.code(mime.uncompressed())
+        table.code(MimeType.Extensionless)
+        self.substitutions = [
+            (table.codes[f], table.codes[n], table.code(m))
+            for (f, n), m in resolver.substitutions.items()
+            if f in table.codes and n in table.codes
+        ]
+        self.size = len(table.mimes)
+        # equal mimes may sit at more than one code; compare by the first
+        self.canonical = self._codes(lambda m: table.codes[m])
+        types: Dict[Optional[str], int] = {}
+        self.type_code = self._codes(lambda m: types.setdefault(m.type, len(types)))
+        self.compressions: Dict[Optional[str], int] = {None: 0}
+        self.compression = self._codes(
+            lambda m: self.compressions.setdefault(m.compression, len(self.compressions))
+        )
+        self.inner_file = self._codes(lambda m: table.codes[m.uncompressed()])
+        self.inner_name = self._codes(lambda m: table.codes[_inner_name_mime(m)])
+
+    def _codes(self, code: Callable[[MimeType], int]) -> 'numpy.ndarray':
+        mimes = self.table.mimes[:self.size]
+        return numpy.fromiter(map(code, mimes), dtype=numpy.intp, count=self.size)
+
+    def flags(self, pred: Callable[[MimeType], bool]) -> 'numpy.ndarray':
+        mimes = self.table.mimes[:self.size]
+        return numpy.fromiter(map(pred, mimes), dtype=bool, count=self.size)
+
+    def resolve(self, file, name):
+        if self.size * self.size <= len(file):
+            # fewer possible pairs than rows: resolve every pair in the table
+            # once and look rows up in that
+            canonical = self.canonical
+            grid_resolved, grid_rules = self.apply_rules(
+                numpy.repeat(canonical, self.size), numpy.tile(canonical, self.size)
+            )
+            pair = file * self.size + name
+            return grid_resolved[pair], grid_rules[pair]
+        return self.apply_rules(self.canonical[file], self.canonical[name])
+
+    def apply_rules(self, f, n):
+        compression = self.compression[f]
+        name_compression = self.compression[n]
+        inner = (compression != 0) & ((name_compression == 0) | (name_compression == compression))
+        f = numpy.where(inner, self.inner_file[f], f)
+        n = numpy.where(inner, self.inner_name[n], n)
+
+        resolved = numpy.full(len(f), -1, dtype=numpy.int32)
+        rules = numpy.full(len(f), -1, dtype=numpy.int8)
+        todo = numpy.ones(len(f), dtype=bool)
+
+        def apply(rule, mask, codes):
+            mask &= todo
+            resolved[mask] = codes[mask]
+            rules[mask] = _rule_ids[rule]
+            todo[mask] = False
+
+        resolver = self.resolver
+        flags = self.flags
+        apply(Matched, f == n, f)
+        apply(Inode, flags(lambda m: m in MimeType.Inodes)[f], f)
+        apply(
+            Extensionless,
+            flags(lambda m: m in MimeType.ExtensionOptional)[f]
+            & flags(lambda m: m == MimeType.Extensionless)[n],
+            f,
+        )
+        binary_name = flags(
+            lambda m: m.type in resolver.binary_types or m in resolver.binary_mimes
+        )
+        apply(CorrectBinary, flags(lambda m: m == MimeType.Binary)[f] & binary_name[n], n)
+        text = flags(lambda m: m.type == "text")
+        apply(CorrectText, text[f] & text[n], n)
+        if self.substitutions:
+            size = self.size
+            keys, order = numpy.unique(
+                [f_code * size + n_code for f_code, n_code, _ in self.substitutions],
+                return_index=True,
+            )
+            results = numpy.array([m for _, _, m in self.substitutions], dtype=numpy.int32)[order]
+            pair = f * size + n
+            at = numpy.minimum(numpy.searchsorted(keys, pair), len(keys) - 1)
+            apply(Substitute, keys[at] == pair, results[at])
+        apply(
+            CorrectFormat,
+            (self.type_code[f] == self.type_code[n])
+            & flags(lambda m: m in resolver.media_correction)[f],
+            f,
+        )
+        self._compress(resolved, inner & (resolved >= 0), compression)
+        return resolved, rules
+
+    def _compress(self, resolved, rows, compression):
+        """Give payload results of compressed contents their compression."""
+        if not rows.any():
+            return
+        names = list(self.compressions)
+        width = len(names)
+        keys, inverse = numpy.unique(
+            resolved[rows].astype(numpy.intp) * width + compression[rows], return_inverse=True
+        )
+        compressed = []
+        for key in keys.tolist():
+            mime = self.table.mimes[key // width]
+            compressed.append(self.table.code(MimeType(mime.type, mime.format, names[key % width])))
+        codes = numpy.array(compressed, dtype=numpy.int32)
+        resolved[rows] = codes[inverse.reshape(-1)]
+
+
+def resolve_codes(
+    resolver: MimeResolver, mimes: Sequence[MimeType], file, name
+) -> Tuple[List[MimeType], Sequence[int], Sequence[int]]:
+    """Resolve the pairs `(mimes[file[i]], mimes[name[i]])`, as
+    `resolver.resolve` would each one.
+
+    `file` and `name` are integer sequences, NumPy arrays or `array`s. Gives
+    the table result codes refer to, which is `mimes` with any substitution
+    results it lacks appended, and the result code and rule id columns, as
+    NumPy arrays when it is installed and `array`s otherwise.
+    """
+    if len(file) != len(name):
+        raise ValueError("file and name columns differ in length")
+    _check(file, len(mimes))
+    _check(name, len(mimes))
+    table = _Table(mimes)
+    if numpy is None or resolver.resolvers != _VECTORIZED:
+        resolved, rules = _resolve_pairs(resolver, table, file, name)
+    else:
+        # the masks add payload mimes to their own table; only the results
+        # among them are carried over
+        masks = _Masks(resolver, _Table(mimes))
+        resolved, rules = masks.resolve(
+            numpy.asarray(file, dtype=numpy.intp), numpy.asarray(name, dtype=numpy.intp)
+        )
+        if len(resolved) and resolved.max() >= len(mimes):
+            added = numpy.unique(resolved[resolved >= len(mimes)])
+            moved = numpy.array(
+                [table.code(masks.table.mimes[code]) for code in added.tolist()], dtype=numpy.int32
+            )
+            rows = resolved >= len(mimes)
+            resolved[rows] = moved[numpy.searchsorted(added, resolved[rows])]
+    return table.mimes, resolved, rules
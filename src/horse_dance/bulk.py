@@ -0,0 +1,165 @@
+"""Classifying long path listings by name alone, without touching disk.
+
+Reads newline or NUL separated paths, such as `find` output or an object
+store inventory, and writes each path's name mime, as `MimeType.of_name`
+gives it, in bounded chunks:
+
+    find /data -type f -print0 | python -m horse_dance.bulk -0 > mimes.tsv
+"""
+from pathlib import PurePath
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+import argparse
+import sys
+
+from horse_dance.extension_index import ExtensionIndex
+from horse_dance.mime_types import MimeType
+
+CHUNK_SIZE = 1 << 20
+
+
+def _name(path: str) -> str:
+    """`PurePath(path).name`, with string operations."""
+    name = path.rstrip('/')
+    name = name[name.rfind('/') + 1:]
+    return PurePath(path).name if name == '.' else name
+
+
+def suffix_key(name: str) -> Optional[str]:
+    """A key for `name` that `ExtensionIndex.guess` gives the same answer
+    for, or `None` if it has no suffix.
+
+    Only the last two extensions take part in guessing, along with whether
+    anything other than dots comes before them, so `x.tar.gz` stands for all
+    names ending in `.tar.gz`."""
+    last = name.rfind('.')
+    if not 0 < last < len(name) - 1:
+        return None
+    start = name.rfind('.', 0, last)
+    if start < 0:
+        start = last
+    if start > 0 and (name[0] != '.' or name[:start].strip('.')):
+        return 'x' + name[start:]
+    return name
+
+
+class SuffixTable:
+    """Name mimes by `suffix_key`, filled in on first sight of each key, so
+    that a listing costs a guess per distinct ending rather than per name.
+
+    Names not starting with a dot whose last extension is neither an
+    encoding nor a suffix alias take a faster path on that extension alone.
+    """
+
+    def __init__(self, index: Optional[ExtensionIndex] = None):
+        self.index = MimeType.extension_index() if index is None else index
+        self.mimes: Dict[Optional[str], MimeType] = {None: MimeType.Extensionless}
+        self.simple: Dict[str, Optional[MimeType]] = {}
+
+    def _simple(self, ext: str) -> Optional[MimeType]:
+        mime = None
+        if ext not in self.index.encodings and ext.lower() not in self.index.suffixes:
+            mime = MimeType.of_str(self.index.types.get(ext.lower()))
+        self.simple[ext] = mime
+        return mime
+
+    def _guess(self, key: Optional[str]) -> MimeType:
+        if key is None:
+            return MimeType.Extensionless
+        mime = self.mimes[key] = MimeType.of_str(*self.index.guess(key))
+        return mime
+
+    def lookup(self, name: str) -> MimeType:
+        key = suffix_key(name)
+        mime = self.mimes.get(key)
+        return self._guess(key) if mime is None else mime
+
+    def classify(self, paths: Iterable[str]) -> List[MimeType]:
+        get, key_of, guess = self.mimes.get, suffix_key, self._guess
+        simple, missing = self.simple, self._simple
+        out: List[MimeType] = []
+        append = out.append
+        for path in paths:
+            name = path[path.rfind('/') + 1:]
+            if name == '' or name == '.':
+                name = _name(path)
+            last = name.rfind('.')
+            if 0 < last < len(name) - 1 and name[0] != '.':
+                ext = name[last:]
+                mime = simple[ext] if ext in simple else missing(ext)
+                if mime is not None:
+                    append(mime)
+                    continue
+            key = key_of(name)
+            mime = get(key)
+            append(guess(key) if mime is None else mime)
+        return out
+
+
+def read_paths(
+    stream: BinaryIO, sep: bytes = b'\n', chunk_size: int = CHUNK_SIZE
+) -> Iterator[List[str]]:
+    """Chunks of the paths in `stream`, decoded as `os.fsdecode` would."""
+    text_sep = sep.decode()
+    rest = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        data = rest + chunk
+        cut = data.rfind(sep)
+        if cut < 0:
+            rest = data
+            continue
+        rest = data[cut + 1:]
+        yield data[:cut].decode('utf-8', 'surrogateescape').split(text_sep)
+    if rest:
+        yield [rest.decode('utf-8', 'surrogateescape')]
+
+
+def classify_stream(
+    source: BinaryIO,
+    sink: BinaryIO,
+    table: Optional[SuffixTable] = None,
+    sep: bytes = b'\n',
+    output: str = 'tsv',
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """Write the name mime of each path in `source` to `sink`, returning
+    the number of paths. Output is `mime<TAB>path` per path for 'tsv', or
+    just the mime, in input order, for 'mime'; records end with `sep`."""
+    table = SuffixTable() if table is None else table
+    text_sep = sep.decode()
+    count = 0
+    for paths in read_paths(source, sep, chunk_size):
+        mimes = table.classify(paths)
+        if output == 'tsv':
+            lines = [f"{mime}\t{path}" for mime, path in zip(mimes, paths)]
+        elif output == 'mime':
+            lines = [str(mime) for mime in mimes]
+        else:
+            raise ValueError(f"unknown output {output!r}")
+        sink.write(text_sep.join(lines).encode('utf-8', 'surrogateescape') + sep)
+        count += len(paths)
+    return count
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Classify paths by name alone.")
+    parser.add_argument("input", nargs="?", help="listing to read, stdin if not given")
+    parser.add_argument("-0", "--null", action="store_true", help="paths are NUL separated")
+    parser.add_argument("--output", choices=("tsv", "mime"), default="tsv")
+    parser.add_argument("--index", help="a saved ExtensionIndex to classify with")
+    args = parser.parse_args(argv)
+
+    table = SuffixTable(None if args.index is None else ExtensionIndex.load(args.index))
+    sep = b'\0' if args.null else b'\n'
+    if args.input is None:
+        classify_stream(sys.stdin.buffer, sys.stdout.buffer, table, sep, args.output)
+    else:
+        with open(args.input, 'rb') as source:
+            classify_stream(source, sys.stdout.buffer, table, sep, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
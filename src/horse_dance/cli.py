@@ -0,0 +1,381 @@
+"""The `horse-dance` command.
+
+    horse-dance scan ROOT          mimes of every path under ROOT
+    horse-dance normalize ROOT     ... along with their normalized names
+    horse-dance plan ROOT          the renames normalizing ROOT would make
+
+Each runs as a pipeline of stages, walk -> detect -> resolve -> normalize,
+each stage with its own worker threads, connected by bounded queues. Results
+are written as one JSON object per line, in walk order, as they come in.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver, Mimes
+from horse_dance.normalizer import FileInfo, FileName, Normalizer
+from horse_dance.renamer import plan_renames
+from horse_dance.scanner import walk
+from horse_dance.snapshot import Snapshot
+
+_DONE = object()
+
+
+@dataclass
+class Entry:
+    seq: int
+    path: Path
+    file: Optional[MimeType] = None
+    mimes: Optional[Mimes] = None
+    info: Optional[FileInfo] = None
+    error: Optional[OSError] = None
+    failed: bool = False
+
+
+class StageStats:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.count = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.max_depth = 0
+        self._depths = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, depth: int, error: bool = False):
+        with self._lock:
+            self.count += 1
+            self.errors += error
+            self.busy += seconds
+            self.max_depth = max(self.max_depth, depth)
+            self._depths += depth
+
+    def mean_depth(self) -> float:
+        return self._depths / self.count if self.count else 0.0
+
+
+Step = Callable[[Entry], None]
+
+
+class Stage:
+    """`workers` threads applying `step` to entries from `inbox` and passing
+    them on to `outbox`. An `OSError` is kept on the entry, which later
+    stages then pass over. Any other exception marks the entry failed and is
+    passed to `fail`; once `stopped` is set, entries are marked failed
+    without being worked on."""
+
+    def __init__(
+        self,
+        name: str,
+        step: Step,
+        workers: int,
+        inbox: queue.Queue,
+        outbox: queue.Queue,
+        fail: Callable[[BaseException], None],
+        stopped: threading.Event,
+    ):
+        self.step = step
+        self.inbox = inbox
+        self.outbox = outbox
+        self.fail = fail
+        self.stopped = stopped
+        self.stats = StageStats(name, workers)
+        self._running = workers
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def _work(self):
+        while True:
+            depth = self.inbox.qsize()
+            entry = self.inbox.get()
+            if entry is _DONE:
+                # leave the end for sibling workers; the last one out passes
+                # it on to the next stage
+                self.inbox.put(_DONE)
+                with self._lock:
+                    self._running -= 1
+                    if self._running == 0:
+                        self.outbox.put(_DONE)
+                return
+            start = time.perf_counter()
+            if entry.error is None and not entry.failed:
+                if self.stopped.is_set():
+                    entry.failed = True
+                else:
+                    try:
+                        self.step(entry)
+                    except OSError as err:
+                        entry.error = err
+                    except BaseException as err:  # pylint: disable=broad-except
+                        entry.failed = True
+                        self.fail(err)
+            self.stats.record(time.perf_counter() - start, depth, entry.error is not None)
+            self.outbox.put(entry)
+
+
+class Pipeline:
+    """Walks `root` through a chain of stages, given as (name, step,
+    workers), yielding entries out of the last one in walk order.
+
+    The first exception other than an `OSError` in any stage stops the walk;
+    entries failed by it are not yielded, and it is raised once the stages
+    have drained."""
+
+    def __init__(
+        self,
+        root: Path,
+        stages: List[Tuple[str, Step, int]],
+        queue_size: int = 1024,
+        follow_symlinks: bool = False,
+    ):
+        self.root = root
+        self.follow_symlinks = follow_symlinks
+        self.walk_errors: "queue.Queue[OSError]" = queue.Queue()
+        self.walked = StageStats("walk", 1)
+        self.failure: Optional[BaseException] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._source: queue.Queue = queue.Queue(queue_size)
+        self.stages: List[Stage] = []
+        inbox = self._source
+        for name, step, workers in stages:
+            outbox: queue.Queue = queue.Queue(queue_size)
+            self.stages.append(
+                Stage(name, step, workers, inbox, outbox, self._fail, self._stopped)
+            )
+            inbox = outbox
+        self._sink = inbox
+
+    def _fail(self, err: BaseException):
+        with self._lock:
+            if self.failure is None:
+                self.failure = err
+            self._stopped.set()
+
+    def _walk(self):
+        try:
+            entries = walk(self.root, self.follow_symlinks, self.walk_errors.put)
+            start = time.perf_counter()
+            for seq, (path, inode) in enumerate(entries):
+                if self._stopped.is_set():
+                    break
+                self.walked.record(time.perf_counter() - start, self._source.qsize())
+                self._source.put(Entry(seq, path, inode))
+                start = time.perf_counter()
+        finally:
+            self._source.put(_DONE)
+
+    def pending(self) -> int:
+        """Entries finished and waiting to be yielded."""
+        return self._sink.qsize()
+
+    def __iter__(self) -> Iterator[Entry]:
+        for stage in self.stages:
+            stage.start()
+        threading.Thread(target=self._walk, name="walk", daemon=True).start()
+        # entries finish out of order across workers, so each is held back
+        # until all those before it have come out
+        held: Dict[int, Entry] = {}
+        next_seq = 0
+        while True:
+            entry = self._sink.get()
+            if entry is _DONE:
+                break
+            held[entry.seq] = entry
+            while next_seq in held:
+                entry = held.pop(next_seq)
+                next_seq += 1
+                if not entry.failed:
+                    yield entry
+        if self.failure is not None:
+            raise self.failure
+
+    def stats(self) -> List[StageStats]:
+        return [self.walked] + [stage.stats for stage in self.stages]
+
+
+def _detect(entry: Entry):
+    if entry.file is None:
+        entry.file = MimeType.of_contents(entry.path)
+
+
+def _steps(
+    resolver: MimeResolver, normalizer: Normalizer, args: argparse.Namespace
+) -> List[Tuple[str, Step, int]]:
+    def resolve(entry: Entry):
+        if args.name_only:
+            entry.mimes = resolver.resolve_path(entry.path, ignore_file=True)
+        else:
+            assert entry.file is not None
+            entry.mimes = resolver.resolve(entry.file, MimeType.of_name(entry.path))
+
+    def normalize(entry: Entry):
+        assert entry.mimes is not None
+        resolved = entry.mimes.resolved
+        if resolved is None:
+            entry.info = FileInfo(entry.path, FileName.of_path(entry.path))
+        else:
+            entry.info = normalizer(entry.path, resolved.mime)
+
+    steps: List[Tuple[str, Step, int]] = []
+    if not args.name_only:
+        steps.append(("detect", _detect, args.detect_workers))
+    steps.append(("resolve", resolve, args.resolve_workers))
+    if args.command != "scan":
+        steps.append(("normalize", normalize, args.normalize_workers))
+    return steps
+
+
+def _mime_record(entry: Entry) -> dict:
+    mimes = entry.mimes
+    assert mimes is not None
+    resolved = mimes.resolved
+    return dict(
+        path=str(entry.path),
+        file=str(mimes.file),
+        name=str(mimes.name),
+        rule=None if resolved is None else type(resolved).__name__,
+        resolved=None if resolved is None else str(resolved.mime),
+    )
+
+
+def _records(command: str, entries: Iterator[Entry]) -> Iterator[dict]:
+    if command == "plan":
+        # directories are left alone, since renaming one moves the files
+        # planned beneath it
+        infos = (
+            entry.info for entry in entries
+            if entry.info is not None and entry.file is not MimeType.Dir
+        )
+        for rename in plan_renames(infos):
+            yield dict(directory=str(rename.directory), source=rename.source, target=rename.target)
+        return
+    for entry in entries:
+        if entry.error is not None:
+            continue
+        record = _mime_record(entry)
+        if command == "normalize":
+            assert entry.info is not None
+            name = entry.info.normalized_name
+            record['normalized'] = None if name is None else str(name)
+        yield record
+
+
+def _errors(entries: Iterator[Entry], pipeline: Pipeline, err_out: TextIO) -> Iterator[Entry]:
+    def report(path, err: OSError):
+        print(f"horse-dance: {path}: {err.strerror or err}", file=err_out)
+
+    for entry in entries:
+        while not pipeline.walk_errors.empty():
+            err = pipeline.walk_errors.get()
+            report(err.filename, err)
+        if entry.error is not None:
+            report(entry.path, entry.error)
+        yield entry
+    while not pipeline.walk_errors.empty():
+        err = pipeline.walk_errors.get()
+        report(err.filename, err)
+
+
+def _print_stats(stats: List[StageStats], elapsed: float, out: TextIO):
+    print(
+        f"{'stage':10} {'workers':>7} {'items':>9} {'errors':>6} {'items/s':>10}"
+        f" {'busy s':>8} {'max queue':>9} {'mean queue':>10}",
+        file=out,
+    )
+    for s in stats:
+        print(
+            f"{s.name:10} {s.workers:7} {s.count:9} {s.errors:6} {s.count / elapsed:10,.0f}"
+            f" {s.busy:8.2f} {s.max_depth:9} {s.mean_depth():10.1f}",
+            file=out,
+        )
+
+
+def _load_config(path: str) -> dict:
+    with open(path) as fh:
+        if path.endswith(".json"):
+            return json.load(fh)
+        import yaml  # type: ignore  # pylint: disable=import-outside-toplevel
+        return yaml.safe_load(fh) or {}
+
+
+def _setup(args: argparse.Namespace) -> Tuple[MimeResolver, Normalizer]:
+    if args.snapshot is not None:
+        return Snapshot.load(args.snapshot).install()
+    config = {} if args.config is None else _load_config(args.config)
+    MimeType.initialize(config.get('mime', {}))
+    return MimeResolver(config.get('resolver')), Normalizer(config.get('normalizer'))
+
+
+def parser() -> argparse.ArgumentParser:
+    main_parser = argparse.ArgumentParser(
+        prog="horse-dance", description="Detect, resolve and normalize file types and names."
+    )
+    commands = main_parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (
+        ("scan", "mimes of every path under a root"),
+        ("normalize", "mimes and normalized names of every path under a root"),
+        ("plan", "renames normalizing every file under a root"),
+    ):
+        sub = commands.add_parser(command, help=help_text)
+        sub.add_argument("root", type=Path)
+        config = sub.add_mutually_exclusive_group()
+        config.add_argument(
+            "--config", help="YAML or JSON config with mime, resolver and normalizer sections"
+        )
+        config.add_argument("--snapshot", help="a compiled config snapshot")
+        sub.add_argument("--name-only", action="store_true", help="do not read file contents")
+        sub.add_argument("--follow-symlinks", action="store_true")
+        sub.add_argument("--detect-workers", type=int, default=8)
+        sub.add_argument("--resolve-workers", type=int, default=1)
+        sub.add_argument("--normalize-workers", type=int, default=1)
+        sub.add_argument("--queue-size", type=int, default=1024)
+        sub.add_argument("--stats", action="store_true", help="report stage throughput on stderr")
+    return main_parser
+
+
+def main(
+    argv: Optional[List[str]] = None, out: TextIO = sys.stdout, err_out: TextIO = sys.stderr
+) -> int:
+    args = parser().parse_args(argv)
+    resolver, normalizer = _setup(args)
+    pipeline = Pipeline(
+        args.root, _steps(resolver, normalizer, args), args.queue_size, args.follow_symlinks
+    )
+    start = time.perf_counter()
+    try:
+        for record in _records(args.command, _errors(iter(pipeline), pipeline, err_out)):
+            out.write(json.dumps(record) + "\n")
+            # flush whenever we catch up, so that output streams to readers
+            if pipeline.pending() == 0:
+                out.flush()
+        out.flush()
+    except BrokenPipeError:
+        # the reader has gone, as with `| head`; keep the interpreter from
+        # failing to flush stdout again on exit
+        if out is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    if args.stats:
+        _print_stats(pipeline.stats(), time.perf_counter() - start, err_out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
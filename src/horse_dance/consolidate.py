@@ -0,0 +1,141 @@
+"""Finding duplicate files and consolidating them into one place."""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set
+import hashlib
+import os
+import shutil
+
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.normalizer import FileName
+from horse_dance.scanner import walk
+
+EDGE_SIZE = 1 << 12
+CHUNK_SIZE = 1 << 20
+
+
+def edge_digest(path: Path, size: int, edge_size: int = EDGE_SIZE) -> bytes:
+    """Hash of the first and last `edge_size` bytes of a file."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fh:
+        digest.update(fh.read(edge_size))
+        if size > edge_size:
+            fh.seek(max(edge_size, size - edge_size))
+            digest.update(fh.read(edge_size))
+    return digest.digest()
+
+
+def full_digest(path: Path, chunk_size: int = CHUNK_SIZE) -> bytes:
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _regroup(groups: Iterable[List[Path]], key: Callable[[Path], Hashable]) -> Iterator[List[Path]]:
+    for group in groups:
+        by_key: Dict[Hashable, List[Path]] = defaultdict(list)
+        for path in group:
+            by_key[key(path)].append(path)
+        yield from (g for g in by_key.values() if len(g) > 1)
+
+
+def find_duplicates(paths: Iterable[Path], edge_size: int = EDGE_SIZE) -> List[List[Path]]:
+    """Groups of two or more files with identical contents, each sorted.
+
+    Candidates are narrowed in stages, so only files that agree on size and
+    on their leading and trailing bytes are ever hashed in full; files small
+    enough for the edges to cover them are not hashed again. Empty files are
+    not considered duplicates.
+    """
+    sizes: Dict[int, List[Path]] = defaultdict(list)
+    for path in paths:
+        size = path.stat().st_size
+        if size > 0:
+            sizes[size].append(path)
+
+    duplicates: List[List[Path]] = []
+    for size, group in sizes.items():
+        if len(group) < 2:
+            continue
+        survivors = _regroup([group], lambda p: edge_digest(p, size, edge_size))
+        if size > 2 * edge_size:
+            survivors = _regroup(survivors, full_digest)
+        duplicates.extend(sorted(g) for g in survivors)
+    return sorted(duplicates)
+
+
+@dataclass
+class Consolidation:
+    canonical: Path
+    target: Path
+    duplicates: List[Path] = field(default_factory=list)
+
+
+def _free_name(directory: Path, name: FileName, taken: Set[str]) -> Path:
+    candidate, n = str(name), 0
+    while candidate in taken or (directory / candidate).exists():
+        n += 1
+        candidate = str(FileName(f"{name.stem}-{n}", name.ext))
+    taken.add(candidate)
+    return directory / candidate
+
+
+class Consolidator:
+    """Moves one canonical copy of each group of duplicates into a target
+    directory, named with the extension resolved from its contents.
+
+    The remaining copies are left in place and reported (`'report'`),
+    deleted (`'remove'`) or replaced by symlinks to the canonical copy
+    (`'symlink'`).
+    """
+    modes = ('report', 'remove', 'symlink')
+
+    def __init__(self, resolver: MimeResolver, target: Path, duplicates: str = 'report'):
+        if duplicates not in self.modes:
+            raise ValueError(f"duplicates must be one of {self.modes}")
+        self.resolver = resolver
+        self.target = target
+        self.duplicates = duplicates
+
+    def target_name(self, path: Path) -> FileName:
+        name = FileName.of_path(path)
+        resolved = self.resolver.resolve_path(path).resolved
+        if resolved is None:
+            return name
+        ext = resolved.mime.correct_extension(name.ext)
+        return name if ext is None else FileName(name.stem, ext)
+
+    def plan(self, groups: Iterable[List[Path]]) -> List[Consolidation]:
+        taken: Set[str] = set()
+        return [
+            Consolidation(
+                group[0], _free_name(self.target, self.target_name(group[0]), taken), group[1:]
+            )
+            for group in groups
+        ]
+
+    def apply(self, plan: Iterable[Consolidation]):
+        self.target.mkdir(parents=True, exist_ok=True)
+        for consolidation in plan:
+            shutil.move(str(consolidation.canonical), str(consolidation.target))
+            for path in consolidation.duplicates:
+                if self.duplicates == 'remove':
+                    path.unlink()
+                elif self.duplicates == 'symlink':
+                    path.unlink()
+                    path.symlink_to(os.path.relpath(consolidation.target, path.parent))
+
+    def __call__(self, root: Path, dry_run: bool = False) -> List[Consolidation]:
+        """Consolidate the duplicates found under `root`, outside the target."""
+        target = self.target.resolve()
+        paths = (
+            path for path, known in walk(root)
+            if known is None and not path.is_symlink() and target not in path.resolve().parents
+        )
+        plan = self.plan(find_duplicates(paths))
+        if not dry_run:
+            self.apply(plan)
+        return plan
@@ -0,0 +1,187 @@
+"""Persistent cache of content detection results."""
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Hashable, List, Optional, Tuple, Union
+import hashlib
+import os
+import threading
+
+if TYPE_CHECKING:
+    import sqlite3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS detections (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    mime TEXT NOT NULL,
+    seen INTEGER NOT NULL,
+    PRIMARY KEY (dev, ino)
+);
+CREATE INDEX IF NOT EXISTS detections_seen ON detections (seen);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+_Key = Tuple[int, int]
+_Row = Tuple[int, int, str, int]
+
+
+def _fingerprint(settings: Hashable) -> int:
+    # a signed 64 bit integer, as sqlite stores them
+    return int.from_bytes(hashlib.sha1(repr(settings).encode()).digest()[:8], "big", signed=True)
+
+
+class DetectionCache:
+    """Detected mime strings keyed on inode identity, validated on size and
+    mtime.
+
+    Each opening of the cache is a new generation; an entry is stamped with
+    the generation that last used it, and `compact` evicts the least recently
+    used entries beyond `max_entries`. Writes are buffered and flushed every
+    `flush_every` updates, on `flush`, and on `close`. Entries are only valid
+    for the detection settings they were made with; `use_settings` drops them
+    when those change. Each thread queries through its own connection.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_entries: Optional[int] = None,
+        flush_every: int = 1024,
+    ):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self.settings: Optional[Hashable] = None
+        # guards the buffered writes and counters, never a query
+        self._lock = threading.Lock()
+        self._pending: Dict[_Key, _Row] = {}
+        self._local = threading.local()
+        self._conns: List['sqlite3.Connection'] = []
+        self._conns_lock = threading.Lock()
+        conn = self._conn()
+        with conn:
+            conn.executescript(_SCHEMA)
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'generation'"
+            ).fetchone()
+            self.generation = 1 if row is None else row[0] + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('generation', ?)",
+                (self.generation,)
+            )
+
+    def _conn(self) -> 'sqlite3.Connection':
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            import sqlite3  # pylint: disable=import-outside-toplevel,redefined-outer-name
+            # only used by this thread, but closed by whichever closes the cache
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            # readers then never wait on a flush in another thread
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def __enter__(self) -> 'DetectionCache':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def use_settings(self, settings: Hashable):
+        """Keep entries only while they were detected with `settings`;
+        entries stored under other settings are dropped."""
+        if settings == self.settings:
+            return
+        fingerprint = _fingerprint(settings)
+        with self._lock:
+            conn = self._conn()
+            with conn:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+                if row is None or row[0] != fingerprint:
+                    self._pending.clear()
+                    conn.execute("DELETE FROM detections")
+                    conn.execute(
+                        "INSERT OR REPLACE INTO meta VALUES ('settings', ?)", (fingerprint,)
+                    )
+            self.settings = settings
+
+    def get(self, st: os.stat_result) -> Optional[str]:
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            row = self._pending.get(key)
+        if row is None:
+            row = self._conn().execute(
+                "SELECT size, mtime_ns, mime, seen FROM detections"
+                " WHERE dev = ? AND ino = ?", key
+            ).fetchone()
+        with self._lock:
+            if row is None or row[:2] != (st.st_size, st.st_mtime_ns):
+                self.misses += 1
+                return None
+            self.hits += 1
+            if row[3] != self.generation:
+                self._stage(key, (row[0], row[1], row[2], self.generation))
+        return row[2]
+
+    def put(self, st: os.stat_result, mime: str):
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            self._stage(key, (st.st_size, st.st_mtime_ns, mime, self.generation))
+
+    def _stage(self, key: _Key, row: _Row):
+        self._pending[key] = row
+        if len(self._pending) >= self.flush_every:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?)",
+                [key + row for key, row in self._pending.items()]
+            )
+        self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._flush()
+        return self._conn().execute("SELECT COUNT(*) FROM detections").fetchone()[0]
+
+    def compact(self, max_entries: Optional[int] = None):
+        """Evict the least recently used entries beyond `max_entries`,
+        reclaiming the freed space."""
+        if max_entries is None:
+            max_entries = self.max_entries
+        with self._lock:
+            self._flush()
+        if max_entries is None:
+            return
+        conn = self._conn()
+        with conn:
+            evicted = conn.execute(
+                "DELETE FROM detections WHERE rowid NOT IN ("
+                " SELECT rowid FROM detections"
+                " ORDER BY seen DESC LIMIT ?)",
+                (max_entries,)
+            ).rowcount
+        if evicted > 0:
+            conn.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._flush()
+        if self.max_entries is not None:
+            self.compact()
+        for conn in self._conns:
+            conn.close()
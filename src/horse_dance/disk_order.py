@@ -0,0 +1,154 @@
+"""Content detection in on-disk order, for spinning and network storage.
+
+Detecting files in listing order seeks all over the disk. Here the files
+are ordered by physical offset, from FIEMAP where the filesystem supports
+it and by inode number otherwise, and their headers read in that order,
+with the kernel told a window of reads ahead of time.
+"""
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional, Tuple, Union
+import fcntl
+import os
+import stat
+import struct
+
+from horse_dance.mime_types import DEFAULT_HEADER_SIZE, MimeType
+from horse_dance.scanner import OnError
+
+FS_IOC_FIEMAP = 0xC020660B
+
+_fiemap = struct.Struct("=QQLLLL")
+_extent = struct.Struct("=QQQ2QL3L")
+
+_WILLNEED = getattr(os, "POSIX_FADV_WILLNEED", None)
+
+
+def physical_offset(fd: int) -> Optional[int]:
+    """The physical offset of a file's first extent, or `None` when the
+    filesystem cannot tell or the file has no extents."""
+    buf = bytearray(_fiemap.size + _extent.size)
+    _fiemap.pack_into(buf, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        fcntl.ioctl(fd, FS_IOC_FIEMAP, buf)
+    except OSError:
+        return None
+    if _fiemap.unpack_from(buf)[3] == 0:
+        return None
+    return _extent.unpack_from(buf, _fiemap.size)[1]
+
+
+# files with a known offset come first on each device, then by inode
+_OrderKey = Tuple[int, int, int]
+
+# as libmagic names them, without opening anything
+_inode_mimes = {
+    stat.S_IFDIR: MimeType.Dir,
+    stat.S_IFIFO: MimeType("inode", "fifo"),
+    stat.S_IFSOCK: MimeType("inode", "socket"),
+    stat.S_IFCHR: MimeType("inode", "chardevice"),
+    stat.S_IFBLK: MimeType("inode", "blockdevice"),
+}
+
+
+def _order_key(path: Path, use_fiemap: bool) -> Union[_OrderKey, MimeType]:
+    """The disk order of a regular file, or the inode mime of anything else."""
+    st = os.lstat(path)
+    if stat.S_ISLNK(st.st_mode):
+        # as `MimeType.of_contents` reports it, failing when dangling
+        os.stat(path)
+        return MimeType.Symlink
+    if not stat.S_ISREG(st.st_mode):
+        return _inode_mimes.get(stat.S_IFMT(st.st_mode), MimeType.Unknown)
+    if use_fiemap:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            offset = physical_offset(fd)
+        finally:
+            os.close(fd)
+        if offset is not None:
+            return st.st_dev, 0, offset
+    return st.st_dev, 1, st.st_ino
+
+
+def disk_order(
+    paths: Iterable[Path], use_fiemap: bool = True, onerror: OnError = None
+) -> Tuple[List[Path], Dict[Path, MimeType]]:
+    """Regular files among `paths` in disk order, and the inode mimes of the
+    other paths, such as directories, which have no contents to read. Paths
+    that cannot be stat'ed go to `onerror`, or raise without it."""
+    keyed = []
+    others: Dict[Path, MimeType] = {}
+    for path in paths:
+        try:
+            key = _order_key(path, use_fiemap)
+        except OSError as err:
+            if onerror is None:
+                raise
+            onerror(err)
+            continue
+        if isinstance(key, MimeType):
+            others[path] = key
+        else:
+            keyed.append((key, path))
+    keyed.sort(key=lambda k: k[0])
+    return [path for _, path in keyed], others
+
+
+def _open_ahead(path: Path, size: int) -> int:
+    fd = os.open(path, os.O_RDONLY)
+    if _WILLNEED is not None:
+        os.posix_fadvise(fd, 0, size, _WILLNEED)
+    return fd
+
+
+def detect_in_disk_order(
+    paths: Iterable[Path],
+    window: int = 32,
+    head_size: Optional[int] = None,
+    use_fiemap: bool = True,
+    onerror: OnError = None,
+) -> Dict[Path, MimeType]:
+    """Detect the mimes of `paths`, keyed by path, reading them in disk order.
+
+    Each file is detected from its first `head_size` bytes (by default the
+    configured `MimeType.header_size`, or `DEFAULT_HEADER_SIZE`), as
+    `MimeType.of_buffer` does. The next `window` files are opened ahead and
+    advised as needed, so the kernel can queue their reads in order. Paths
+    other than regular files get their inode mimes.
+    """
+    size = head_size or MimeType.header_size or DEFAULT_HEADER_SIZE
+    files, mimes = disk_order(paths, use_fiemap, onerror)
+    ahead: Deque[Tuple[Path, int]] = deque()
+    upcoming = iter(files)
+
+    def fail(err: OSError):
+        if onerror is None:
+            raise err
+        onerror(err)
+
+    try:
+        while True:
+            while len(ahead) < window:
+                path = next(upcoming, None)
+                if path is None:
+                    break
+                try:
+                    ahead.append((path, _open_ahead(path, size)))
+                except OSError as err:
+                    fail(err)
+            if not ahead:
+                break
+            path, fd = ahead.popleft()
+            try:
+                data = os.pread(fd, size, 0)
+            except OSError as err:
+                fail(err)
+                continue
+            finally:
+                os.close(fd)
+            mimes[path] = MimeType.of_buffer(data, path)
+    finally:
+        for _, fd in ahead:
+            os.close(fd)
+    return mimes
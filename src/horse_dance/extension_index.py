@@ -0,0 +1,103 @@
+"""Precomputed lookups between extensions and mime strings."""
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Tuple, Union
+import json
+import mimetypes
+import posixpath
+
+
+@dataclass(frozen=True)
+class ExtensionIndex:
+    """A frozen snapshot of the `mimetypes` tables, non-strict, in both
+    directions, along with the preferred and optional extension config.
+
+    Extensions in `types`, `encodings` and `suffixes` keep their leading dot,
+    as in `mimetypes`; extensions listed per mime do not.
+    """
+    types: Dict[str, str]
+    encodings: Dict[str, str]
+    suffixes: Dict[str, str]
+    extensions: Dict[str, Tuple[str, ...]]
+    preferred_ext: Dict[str, str] = field(default_factory=dict)
+    ext_optional: Tuple[str, ...] = ()
+
+    _extension_sets: Dict[str, FrozenSet[str]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+
+    @staticmethod
+    def of_mimetypes(
+        preferred_ext: Optional[Dict[str, str]] = None, ext_optional: Tuple[str, ...] = ()
+    ) -> 'ExtensionIndex':
+        if not mimetypes.inited:
+            mimetypes.init()
+        types = dict(mimetypes.common_types)
+        types.update(mimetypes.types_map)
+        extensions = {
+            mime: tuple(
+                ext[1:] for ext in mimetypes.guess_all_extensions(mime, strict=False)
+            )
+            for mime in sorted(set(types.values()))
+        }
+        return ExtensionIndex(
+            types=types,
+            encodings=dict(mimetypes.encodings_map),
+            suffixes=dict(mimetypes.suffix_map),
+            extensions={mime.lower(): exts for mime, exts in extensions.items()},
+            preferred_ext=dict(preferred_ext or {}),
+            ext_optional=tuple(ext_optional),
+        )
+
+    def guess(self, name: str) -> Tuple[Optional[str], Optional[str]]:
+        """Mime and encoding of a file name, as `mimetypes.guess_type` with
+        `strict=False` would give them."""
+        base, ext = posixpath.splitext(name)
+        while ext.lower() in self.suffixes:
+            base, ext = posixpath.splitext(base + self.suffixes[ext.lower()])
+        encoding = self.encodings.get(ext)
+        if encoding is not None:
+            base, ext = posixpath.splitext(base)
+        return self.types.get(ext.lower()), encoding
+
+    def extensions_of(self, mime: str) -> Tuple[str, ...]:
+        """Extensions of a mime, in `mimetypes.guess_all_extensions` order."""
+        return self.extensions.get(mime.lower(), ())
+
+    def encoding_extension(self, encoding: str) -> Optional[str]:
+        """The first extension, without its dot, giving an encoding."""
+        for ext, enc in self.encodings.items():
+            if enc == encoding:
+                return ext[1:]
+        return None
+
+    def extension_set(self, mime: str) -> FrozenSet[str]:
+        exts = self._extension_sets.get(mime)
+        if exts is None:
+            exts = self._extension_sets.setdefault(mime, frozenset(self.extensions_of(mime)))
+        return exts
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        del data['_extension_sets']
+        return data
+
+    @staticmethod
+    def of_dict(data: dict) -> 'ExtensionIndex':
+        return ExtensionIndex(
+            types=data['types'],
+            encodings=data['encodings'],
+            suffixes=data['suffixes'],
+            extensions={mime: tuple(exts) for mime, exts in data['extensions'].items()},
+            preferred_ext=data.get('preferred_ext', {}),
+            ext_optional=tuple(data.get('ext_optional', ())),
+        )
+
+    def dump(self, path: Union[str, Path]):
+        with open(path, 'w') as fh:
+            json.dump(self.to_dict(), fh)
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> 'ExtensionIndex':
+        with open(path) as fh:
+            return ExtensionIndex.of_dict(json.load(fh))
@@ -0,0 +1,159 @@
+"""Timing and counting the stages of detection, resolution and normalization.
+
+Instrumentation works by wrapping the instrumented methods in place while
+enabled, so that disabled it costs nothing at all:
+
+    with instrumented() as metrics:
+        ...
+    print(metrics.to_prometheus())
+"""
+from contextlib import contextmanager
+from functools import partial, wraps
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import json
+import threading
+import time
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.normalizer import Normalizer
+
+Hook = Callable[[str, float], None]
+
+# stage name -> (owner, attribute) of the instrumented methods
+STAGES: Dict[str, Tuple[type, str]] = {
+    "mime.of_file": (MimeType, "of_file"),
+    "mime.of_contents": (MimeType, "of_contents"),
+    "mime.of_name": (MimeType, "of_name"),
+    "mime.detect": (MimeType, "_detect"),
+    "mime.sniff": (MimeType, "_sniff"),
+    "mime.correct_extension": (MimeType, "correct_extension"),
+    "normalizer.normalize": (Normalizer, "_normalize"),
+    "normalizer.slug": (Normalizer, "_make_slug"),
+    "normalizer.disambiguate": (Normalizer, "_disambiguate"),
+}
+
+
+class Metrics:
+    """Call counts and total seconds per stage, and event counters, such as
+    how often each resolution rule resolves. `hooks` are called with each
+    stage's name and duration as it completes."""
+
+    def __init__(self, hooks: Optional[List[Hook]] = None):
+        self.hooks = [] if hooks is None else hooks
+        self.timers: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def time(self, stage: str, seconds: float):
+        with self._lock:
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+        for hook in self.hooks:
+            hook(stage, seconds)
+
+    def count(self, event: str, n: int = 1):
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(
+                stages={
+                    stage: dict(count=int(count), seconds=seconds)
+                    for stage, (count, seconds) in sorted(self.timers.items())
+                },
+                counters=dict(sorted(self.counters.items())),
+            )
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix: str = "horse_dance") -> str:
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_seconds summary"]
+        for stage, timer in snapshot["stages"].items():
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {timer["count"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {timer["seconds"]}')
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for event, count in snapshot["counters"].items():
+            lines.append(f'{prefix}_events_total{{event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _timed(metrics: Metrics, stage: str, fn: Callable) -> Callable:
+    @wraps(fn)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.time(stage, time.perf_counter() - start)
+    return timed
+
+
+def _resolve(metrics: Metrics, fn: Callable) -> Callable:
+    """Times resolution, and counts the rule of each resolved pair, including
+    those a memoized resolver answers from its cache."""
+    @wraps(fn)
+    def resolve(*args, **kwargs):
+        start = time.perf_counter()
+        mimes = fn(*args, **kwargs)
+        metrics.time("resolver.resolve", time.perf_counter() - start)
+        if mimes.resolved is not None:
+            metrics.count(f"rule.{type(mimes.resolved).__name__}")
+        return mimes
+    return resolve
+
+
+def _wrap(descriptor, wrapper: Callable[[Callable], Callable]):
+    if isinstance(descriptor, (classmethod, staticmethod)):
+        return type(descriptor)(wrapper(descriptor.__func__))
+    return wrapper(descriptor)
+
+
+_installed: List[Tuple[type, str, object]] = []
+_active: Optional[Metrics] = None
+
+
+def enable(metrics: Optional[Metrics] = None) -> Metrics:
+    """Start instrumenting into `metrics`, or a new `Metrics`."""
+    global _active  # pylint: disable=global-statement
+    disable()
+    _active = Metrics() if metrics is None else metrics
+    m = _active
+
+    def install(owner: type, attr: str, wrapper: Callable[[Callable], Callable]):
+        original = owner.__dict__[attr]
+        _installed.append((owner, attr, original))
+        setattr(owner, attr, _wrap(original, wrapper))
+
+    for stage, (owner, attr) in STAGES.items():
+        install(owner, attr, partial(_timed, m, stage))
+    for rule in MimeResolver.resolvers:
+        install(rule, "resolve", partial(_timed, m, f"rule.{rule.__name__}"))
+    install(MimeResolver, "resolve", partial(_resolve, m))
+    return m
+
+
+def disable():
+    """Stop instrumenting, restoring the original methods."""
+    global _active  # pylint: disable=global-statement
+    while _installed:
+        owner, attr, original = _installed.pop()
+        setattr(owner, attr, original)
+    _active = None
+
+
+def active() -> Optional[Metrics]:
+    return _active
+
+
+@contextmanager
+def instrumented(metrics: Optional[Metrics] = None) -> Iterator[Metrics]:
+    m = enable(metrics)
+    try:
+        yield m
+    finally:
+        disable()
@@ -0,0 +1,53 @@
+"""Per-thread libmagic handles.
+
+`magic` is imported on first use, so that loading libmagic is only paid
+for when file contents are actually detected.
+"""
+from functools import reduce
+from operator import or_
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Optional, Union
+import threading
+
+if TYPE_CHECKING:
+    import magic  # type: ignore
+
+
+def no_check_flags(names: Iterable[str]) -> int:
+    """Combine libmagic `MAGIC_NO_CHECK_*` flags given by suffix, e.g. 'tar'."""
+    names = tuple(names)
+    if not names:
+        return 0
+    import magic  # type: ignore  # pylint: disable=import-outside-toplevel,redefined-outer-name
+    return reduce(or_, (getattr(magic, f"MAGIC_NO_CHECK_{n.upper()}") for n in names), 0)
+
+
+class MagicPool:
+    """Mime detection with one `magic.Magic` handle per thread.
+
+    python-magic's module-level functions share a single handle behind a lock,
+    so concurrent detection serializes. Here each thread loads its own handle
+    on first use and keeps it for the life of the thread.
+    """
+
+    def __init__(self, no_check: Iterable[str] = (), magic_file: Optional[str] = None):
+        self.flags = no_check_flags(no_check)
+        self.magic_file = magic_file
+        self._local = threading.local()
+
+    def handle(self) -> 'magic.Magic':
+        handle = getattr(self._local, 'handle', None)
+        if handle is None:
+            import magic  # type: ignore  # pylint: disable=import-outside-toplevel,redefined-outer-name
+            handle = magic.Magic(mime=True, magic_file=self.magic_file)
+            if self.flags:
+                handle.flags |= self.flags
+                magic.magic_setflags(handle.cookie, handle.flags)
+            self._local.handle = handle
+        return handle
+
+    def from_file(self, path: Union[str, Path]) -> str:
+        return self.handle().from_file(str(path))
+
+    def from_buffer(self, data: bytes) -> str:
+        return self.handle().from_buffer(data)
@@ -0,0 +1,253 @@
+"""Saved scans of a tree, for rescanning only what changed."""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import gzip
+import json
+import os
+import stat
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver, MimeResolution, Mimes, NameOnly
+from horse_dance.normalizer import FileInfo, FileName, Normalizer
+
+MANIFEST_VERSION = 1
+
+_rules = {rule.__name__: rule for rule in [NameOnly] + MimeResolver.resolvers}
+
+
+@dataclass
+class DirRecord:
+    mtime_ns: int
+    subdirs: List[str]
+    files: List[str]
+
+
+@dataclass
+class FileRecord:
+    ino: int
+    size: int
+    mtime_ns: int
+    mimes: Mimes
+    normalized_name: Optional[FileName] = None
+
+    def same_file(self, st: os.stat_result) -> bool:
+        return (self.ino, self.size, self.mtime_ns) == (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def info(self, path: Path) -> FileInfo:
+        return FileInfo(path, FileName.of_path(path), self.normalized_name)
+
+
+@dataclass(frozen=True)
+class Change:
+    kind: str  # 'added', 'modified' or 'removed'
+    path: str
+    record: Optional[FileRecord] = None
+
+
+class _Codes:
+    """Interns values to integer codes for columnar storage, `None` being -1."""
+
+    def __init__(self, table: Iterable = ()):
+        self.table = list(table)
+        self.codes = {self._key(v): i for i, v in enumerate(self.table)}
+
+    @staticmethod
+    def _key(value):
+        return tuple(value) if isinstance(value, list) else value
+
+    def code(self, value) -> int:
+        if value is None:
+            return -1
+        key = self._key(value)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.table)
+            self.table.append(value)
+        return code
+
+    def value(self, code: int):
+        return None if code < 0 else self.table[code]
+
+
+def _mime_value(mime: Optional[MimeType]) -> Optional[list]:
+    return None if mime is None else [mime.type, mime.format, mime.compression]
+
+
+def _mime(codes: _Codes, code: int) -> MimeType:
+    value = codes.value(code)
+    if value is None:
+        raise ValueError("manifest is missing a mime")
+    return MimeType(*value)
+
+
+def _rule_name(resolution: Optional[MimeResolution]) -> Optional[str]:
+    return None if resolution is None else type(resolution).__name__
+
+
+def _resolved_mime(mimes: Mimes) -> Optional[MimeType]:
+    return None if mimes.resolved is None else mimes.resolved.mime
+
+
+@dataclass
+class Manifest:
+    """Directory mtimes and per-file identity, mimes and normalized names,
+    keyed by paths relative to the scanned root, '' being the root itself.
+    Stored as gzipped JSON columns with mimes and rules coded into tables.
+    """
+    dirs: Dict[str, DirRecord] = field(default_factory=dict)
+    files: Dict[str, FileRecord] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        mimes, rules = _Codes(), _Codes()
+        files = list(self.files.items())
+        return dict(
+            version=MANIFEST_VERSION,
+            dirs=dict(
+                path=list(self.dirs),
+                mtime_ns=[d.mtime_ns for d in self.dirs.values()],
+                subdirs=[d.subdirs for d in self.dirs.values()],
+                files=[d.files for d in self.dirs.values()],
+            ),
+            files=dict(
+                path=[p for p, _ in files],
+                ino=[r.ino for _, r in files],
+                size=[r.size for _, r in files],
+                mtime_ns=[r.mtime_ns for _, r in files],
+                file=[mimes.code(_mime_value(r.mimes.file)) for _, r in files],
+                name=[mimes.code(_mime_value(r.mimes.name)) for _, r in files],
+                rule=[rules.code(_rule_name(r.mimes.resolved)) for _, r in files],
+                resolved=[mimes.code(_mime_value(_resolved_mime(r.mimes))) for _, r in files],
+                stem=[r.normalized_name and r.normalized_name.stem for _, r in files],
+                ext=[r.normalized_name and r.normalized_name.ext for _, r in files],
+            ),
+            mimes=mimes.table,
+            rules=rules.table,
+        )
+
+    @staticmethod
+    def of_dict(data: dict) -> 'Manifest':
+        if data.get('version') != MANIFEST_VERSION:
+            raise ValueError(f"unsupported manifest version {data.get('version')}")
+        mimes, rules = _Codes(data['mimes']), _Codes(data['rules'])
+        d, f = data['dirs'], data['files']
+        manifest = Manifest()
+        for path, mtime_ns, subdirs, files in zip(d['path'], d['mtime_ns'], d['subdirs'], d['files']):
+            manifest.dirs[path] = DirRecord(mtime_ns, subdirs, files)
+        for row in zip(
+            f['path'], f['ino'], f['size'], f['mtime_ns'], f['file'], f['name'],
+            f['rule'], f['resolved'], f['stem'], f['ext']
+        ):
+            path, ino, size, mtime_ns, file_code, name_code, rule, resolved, stem, ext = row
+            resolution: Optional[MimeResolution] = None
+            if rule >= 0:
+                resolution = _rules[rules.table[rule]](_mime(mimes, resolved))
+            manifest.files[path] = FileRecord(
+                ino, size, mtime_ns,
+                Mimes(_mime(mimes, file_code), _mime(mimes, name_code), resolution),
+                None if stem is None else FileName(stem, ext),
+            )
+        return manifest
+
+    def save(self, path: Union[str, Path]):
+        with gzip.open(path, 'wt') as fh:
+            json.dump(self.to_dict(), fh, separators=(',', ':'))
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> 'Manifest':
+        with gzip.open(path, 'rt') as fh:
+            return Manifest.of_dict(json.load(fh))
+
+
+def _join(rel: str, name: str) -> str:
+    return f"{rel}/{name}" if rel else name
+
+
+class ManifestScanner:
+    """Scans a tree into a `Manifest`, resolving and normalizing only files
+    that are new or changed since a previous manifest.
+
+    A directory whose mtime is unchanged has the same entries, so it is not
+    listed again; its subdirectories are still visited, since their changes
+    do not touch its mtime. Files are matched on inode, size and mtime; with
+    `check_files` off, files in unchanged directories are trusted without
+    being stat'ed, which misses contents rewritten in place.
+    """
+
+    def __init__(
+        self,
+        resolver: Optional[MimeResolver] = None,
+        normalizer: Optional[Normalizer] = None,
+        check_files: bool = True,
+    ):
+        self.resolver = MimeResolver() if resolver is None else resolver
+        self.normalizer = Normalizer() if normalizer is None else normalizer
+        self.check_files = check_files
+
+    def record(self, path: Path, st: os.stat_result) -> FileRecord:
+        mimes = self.resolver.resolve_file(
+            path, MimeType.Dir if stat.S_ISDIR(st.st_mode) else None
+        )
+        normalized = None
+        if mimes.resolved is not None:
+            normalized = self.normalizer(path, mimes.resolved.mime).normalized_name
+        return FileRecord(st.st_ino, st.st_size, st.st_mtime_ns, mimes, normalized)
+
+    def scan(
+        self, root: Path, previous: Optional[Manifest] = None
+    ) -> Tuple[Manifest, List[Change]]:
+        """The manifest of `root` and its changes from `previous`."""
+        if previous is None:
+            previous = Manifest()
+        manifest = Manifest()
+        changes: List[Change] = []
+        stack = [""]
+        while stack:
+            rel = stack.pop()
+            directory = root / rel
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+                prev_dir = previous.dirs.get(rel)
+                if prev_dir is not None and prev_dir.mtime_ns == mtime_ns:
+                    subdirs, files = prev_dir.subdirs, prev_dir.files
+                    listed = False
+                else:
+                    subdirs, files = self._list(directory)
+                    listed = True
+            except FileNotFoundError:
+                # removed since its parent was listed
+                continue
+            manifest.dirs[rel] = DirRecord(mtime_ns, subdirs, files)
+
+            for name in files:
+                path = _join(rel, name)
+                prev_file = previous.files.get(path)
+                if prev_file is not None and not listed and not self.check_files:
+                    manifest.files[path] = prev_file
+                    continue
+                try:
+                    st = os.stat(root / path)
+                except FileNotFoundError:
+                    continue
+                if prev_file is not None and prev_file.same_file(st):
+                    manifest.files[path] = prev_file
+                    continue
+                record = manifest.files[path] = self.record(root / path, st)
+                changes.append(Change('added' if prev_file is None else 'modified', path, record))
+            stack.extend(_join(rel, name) for name in reversed(subdirs))
+
+        changes.extend(
+            Change('removed', path) for path in previous.files if path not in manifest.files
+        )
+        return manifest, changes
+
+    @staticmethod
+    def _list(directory: Path) -> Tuple[List[str], List[str]]:
+        subdirs, files = [], []
+        with os.scandir(directory) as it:
+            for entry in sorted(it, key=lambda e: e.name):
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+        return subdirs, files
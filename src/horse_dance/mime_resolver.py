@@ -1,10 +1,13 @@
 """File type detection and extension correction via mime."""
+from concurrent.futures import Executor
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path, PurePath
-from typing import Optional, Union, Tuple, Set, ClassVar
+from typing import Optional, Union, Tuple, Set, ClassVar, Iterator, Dict
 from enum import Enum, auto
 
 from horse_dance.mime_types import MimeType
+from horse_dance.scanner import walk, bounded_submit, default_executor, OnError
 
 
 @dataclass(frozen=True)
@@ -21,7 +24,20 @@ class MimeResolution():
         cls, res: 'MimeResolver', file_mime: MimeType, name_mime: MimeType
     ) -> Optional['MimeResolution']:
         resolution = cls.resolve(res, file_mime, name_mime)
-        return cls(resolution) if resolution is not None else None
+        if resolution is None:
+            return None
+        return cls.of_mime(resolution)
+
+    @classmethod
+    def of_mime(cls, mime: MimeType) -> 'MimeResolution':
+        key = (cls, mime)
+        interned = _interned_resolutions.get(key)
+        if interned is None:
+            interned = _interned_resolutions.setdefault(key, cls(mime))
+        return interned
+
+
+_interned_resolutions: Dict[Tuple[type, MimeType], MimeResolution] = {}
 
 
 @dataclass(frozen=True)
@@ -95,6 +111,14 @@ class CorrectFormat(MimeResolution):
         return file_mime if pred else None
 
 
+def _inner_name_mime(name_mime: MimeType) -> MimeType:
+    """The mime of a name with its compression extension, if any, removed;
+    a name with only that extension, like `data.gz`, is extensionless."""
+    if name_mime.compression is not None and name_mime.type is None:
+        return MimeType.Extensionless
+    return name_mime.uncompressed()
+
+
 @dataclass(frozen=True)
 class Mimes:
     file: MimeType
@@ -132,12 +156,49 @@ class MimeResolver():
         self.media_correction = _config_set("media_correction")
         self.binary_types = frozenset(config.get("binary_types", []))
 
+        # Resolution depends only on the pair of mimes, so with a cache size
+        # set, `resolve` is replaced by a memo of it. `None` is unbounded.
+        self.memoized = "cache_size" in config
+        self.cache_size = config.get("cache_size")
+        self._install_memo()
+
+    def _install_memo(self):
+        self._memo = None
+        if self.memoized:
+            self._memo = lru_cache(maxsize=self.cache_size)(self.resolve_uncached)
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if k != "_memo"}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._install_memo()
+
+    def cache_info(self):
+        return None if self._memo is None else self._memo.cache_info()
+
     def resolve(self, file_mime: MimeType, name_mime: MimeType) -> Mimes:
+        if self._memo is not None:
+            return self._memo(file_mime, name_mime)
+        return self.resolve_uncached(file_mime, name_mime)
+
+    def resolve_uncached(self, file_mime: MimeType, name_mime: MimeType) -> Mimes:
+        compression = file_mime.compression
+        if compression is None or name_mime.compression not in (None, compression):
+            return Mimes(file_mime, name_mime, self._resolution(file_mime, name_mime))
+        # compressed contents resolve on their payload, keeping the compression
+        m = self._resolution(file_mime.uncompressed(), _inner_name_mime(name_mime))
+        if m is None:
+            return Mimes(file_mime, name_mime)
+        compressed = MimeType(m.mime.type, m.mime.format, compression)
+        return Mimes(file_mime, name_mime, type(m).of_mime(compressed))
+
+    def _resolution(self, file_mime: MimeType, name_mime: MimeType) -> Optional[MimeResolution]:
         for res in self.resolvers:
             m = res.resolution(self, file_mime, name_mime)
             if m is not None:
-                return Mimes(file_mime, name_mime, m)
-        return Mimes(file_mime, name_mime)
+                return m
+        return None
 
     def resolve_path(self, path: PurePath, ignore_file: bool = False) -> Mimes:
         name_mime = MimeType.of_name(path)
@@ -147,3 +208,49 @@ class MimeResolver():
             return self.resolve(file_mime, name_mime)
 
         return Mimes(MimeType.Unknown, name_mime, NameOnly(name_mime))
+
+    def resolve_file(self, path: Path, file_mime: Optional[MimeType] = None) -> Mimes:
+        if file_mime is None:
+            file_mime = MimeType.of_contents(path)
+        return self.resolve(file_mime, MimeType.of_name(path))
+
+    def _resolve_entry(self, entry: Tuple[Path, Optional[MimeType]]) -> Mimes:
+        return self.resolve_file(*entry)
+
+    def scan(
+        self,
+        root: Path,
+        workers: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        window: Optional[int] = None,
+        follow_symlinks: bool = False,
+        onerror: OnError = None,
+    ) -> Iterator[Tuple[Path, Mimes]]:
+        """Resolve every path under `root`, in walk order.
+
+        Detection is fanned out over `executor` (a thread pool of `workers`
+        threads by default), with at most `window` paths in flight. Errors
+        detecting a file are passed to `onerror` and the file skipped; without
+        `onerror` they are raised.
+        """
+        own_executor = executor is None
+        if executor is None:
+            executor = default_executor(workers)
+        if window is None:
+            window = 4 * (workers or 8)
+
+        entries = walk(root, follow_symlinks=follow_symlinks, onerror=onerror)
+        try:
+            for (path, _), future in bounded_submit(
+                self._resolve_entry, entries, executor, window
+            ):
+                err = future.exception()
+                if err is None:
+                    yield path, future.result()
+                elif onerror is not None and isinstance(err, OSError):
+                    onerror(err)
+                else:
+                    raise err
+        finally:
+            if own_executor:
+                executor.shutdown(wait=True)
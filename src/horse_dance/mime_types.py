@@ -1,21 +1,61 @@
 """File type detection and extension correction via mime."""
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path, PurePath
-from typing import Optional, Union, Tuple, Set, ClassVar, FrozenSet
+from typing import Optional, Union, Tuple, Set, ClassVar, FrozenSet, Dict, Callable
+import bz2
+import errno
+import gzip
+import lzma
 import mimetypes
 import logging
+import os
+import zlib
 from enum import Enum, auto
 
-import magic  # type: ignore
+from horse_dance.detection_cache import DetectionCache
+from horse_dance.magic_pool import MagicPool
+from horse_dance.extension_index import ExtensionIndex
+from horse_dance.signatures import HEAD_SIZE, SniffStats, sniff_signature
 
+DEFAULT_HEADER_SIZE = 1 << 16
 
-@dataclass(frozen=True)
+
+def read_header(path: Path, size: int = DEFAULT_HEADER_SIZE, follow_symlinks: bool = True) -> bytes:
+    """Read at most `size` leading bytes of a file with a single read."""
+    fd = os.open(path, os.O_RDONLY if follow_symlinks else os.O_RDONLY | os.O_NOFOLLOW)
+    try:
+        return os.read(fd, size)
+    finally:
+        os.close(fd)
+
+
+_MimeKey = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+@dataclass(frozen=True, init=False, eq=False)
 class MimeType:
-    type: Optional[str] = None
-    format: Optional[str] = None
-    compression: Optional[str] = None
+    """A mime type with compression.
+
+    Instances are interned: constructing an equal mime returns the existing
+    object, so equality and hashing are by identity.
+    """
+    __slots__ = ('type', 'format', 'compression', '_str')
+
+    type: Optional[str]
+    format: Optional[str]
+    compression: Optional[str]
+
+    _registry: ClassVar[Dict[_MimeKey, 'MimeType']] = {}
 
     preferred_ext: ClassVar[dict] = {}
+    index: ClassVar[Optional[ExtensionIndex]] = None
+    cache: ClassVar[Optional[DetectionCache]] = None
+    header_size: ClassVar[Optional[int]] = None
+    sniff_compressed: ClassVar[bool] = False
+    signatures: ClassVar[bool] = True
+    sniff_stats: ClassVar[SniffStats] = SniffStats()
+    magic_pool: ClassVar[MagicPool] = MagicPool()
 
     Dir: ClassVar['MimeType']
     Symlink: ClassVar['MimeType']
@@ -29,11 +69,61 @@ class MimeType:
     Compressed: ClassVar[dict]
     ExtensionOptional: ClassVar[FrozenSet['MimeType']]
 
+    def __new__(
+        cls,
+        type: Optional[str] = None,
+        format: Optional[str] = None,
+        compression: Optional[str] = None,
+    ) -> 'MimeType':
+        key = (type, format, compression)
+        mime = cls._registry.get(key)
+        if mime is None:
+            mime = object.__new__(cls)
+            object.__setattr__(mime, 'type', type)
+            object.__setattr__(mime, 'format', format)
+            object.__setattr__(mime, 'compression', compression)
+            comp_str = "" if compression is None else f"!{compression}"
+            object.__setattr__(mime, '_str', f"{type}/{format}{comp_str}")
+            mime = cls._registry.setdefault(key, mime)
+        return mime
+
+    def __reduce__(self):
+        return (MimeType, (self.type, self.format, self.compression))
+
     @classmethod
     def initialize(cls, config: Optional[dict] = None):
         if config is None:
             config = {}  # pragma: no cover
 
+        if 'index' in config:
+            cls.use_index(ExtensionIndex.load(config['index']))
+        else:
+            cls.use_index(cls.build_index(config))
+        cls.configure(config)
+
+    @classmethod
+    def configure(cls, config: dict):
+        """Apply the detection settings of a config, leaving the index."""
+        cls.magic_pool = MagicPool(**config.get('magic', {}))
+
+        header_size = config.get('header_size')
+        cls.header_size = (
+            DEFAULT_HEADER_SIZE if header_size is True else header_size or None
+        )
+
+        cls.sniff_compressed = config.get('sniff_compressed', False)
+        cls.signatures = config.get('signatures', True)
+
+        cache_config = config.get('cache')
+        if cache_config is not None:
+            cls.use_cache(DetectionCache(
+                cache_config['path'], cache_config.get('max_entries')
+            ))
+
+    @staticmethod
+    def build_index(config: dict) -> ExtensionIndex:
+        """Load the `mimetypes` tables with the configured extra paths and
+        types, and index them along with the extension preferences."""
         mime_paths = config.get('paths', [])
         if 'path' in config:
             mime_paths.append(config['path'])
@@ -44,17 +134,33 @@ class MimeType:
         for extra in config.get('extras', []):
             mimetypes.add_type(extra["mime"], "." + extra["ext"])
 
+        return ExtensionIndex.of_mimetypes(
+            preferred_ext={pref["mime"]: pref["ext"] for pref in config.get('preferred_ext', [])},
+            ext_optional=tuple(config.get('ext_optional', [])),
+        )
+
+    @classmethod
+    def use_index(cls, index: ExtensionIndex):
+        cls.index = index
         cls.preferred_ext = {
-            MimeType.of_str(pref["mime"]): pref["ext"]
-            for pref in config.get('preferred_ext', [])
+            MimeType.of_str(mime): ext for mime, ext in index.preferred_ext.items()
         }
+        cls.ExtensionOptional = frozenset(map(MimeType.of_str, index.ext_optional))
 
-        cls.ExtensionOptional = frozenset({
-            MimeType.of_str(exop)
-            for exop in config.get('ext_optional', [])
-        })
+    @classmethod
+    def extension_index(cls) -> ExtensionIndex:
+        if cls.index is None:
+            cls.index = ExtensionIndex.of_mimetypes()
+        return cls.index
+
+    @classmethod
+    def use_cache(cls, cache: Optional[DetectionCache]):
+        if cls.cache is not None:
+            cls.cache.close()
+        cls.cache = cache
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def of_str(mime_str: Optional[str], compression: Optional[str] = None) -> 'MimeType':
         if mime_str is None or mime_str == "":
             return MimeType(compression=compression)
@@ -68,45 +174,129 @@ class MimeType:
     def of_file(cls, path: Path, use_name_for_compressed=True) -> 'MimeType':
         if path.is_dir():
             return cls.Dir
-        mime = cls.of_str(magic.from_file(str(path), mime=True))
-        if not use_name_for_compressed:
-            return mime
+        return cls.of_contents(path, use_name_for_compressed)
+
+    @classmethod
+    def of_contents(cls, path: Path, use_name_for_compressed=True) -> 'MimeType':
+        """Detect from the file's data, for paths known not to be directories."""
+        mime = cls.of_str(cls._detect(path))
         compression = mime.extract_compression()
-        if compression is None:
+        if compression is not None and cls.sniff_compressed:
+            inner = cls._of_decompressed(
+                compression, lambda size: _read_decompressed(path, compression, size)
+            )
+            if inner is not None:
+                return inner
+        return cls._name_for_compressed(mime, path if use_name_for_compressed else None)
+
+    @classmethod
+    def of_buffer(
+        cls, data: bytes, path: Optional[PurePath] = None, use_name_for_compressed=True
+    ) -> 'MimeType':
+        """Detect from leading bytes of a file's data, such as a header read
+        with `read_header` or the first chunk of an upload. When `path` is
+        given it is used to name compressed data."""
+        mime = cls.of_str(_sniff_buffer(data))
+        compression = mime.extract_compression()
+        if compression is not None and cls.sniff_compressed:
+            inner = cls._of_decompressed(
+                compression, lambda size: decompress_head(data, compression, size)
+            )
+            if inner is not None:
+                return inner
+        return cls._name_for_compressed(mime, path if use_name_for_compressed else None)
+
+    @classmethod
+    def _of_decompressed(
+        cls, compression: str, head: Callable[[int], bytes]
+    ) -> Optional['MimeType']:
+        """The inner mime of compressed data, with `compression` set to the
+        encoding name that `of_name` gives for its extension, or `None` if the
+        data cannot be decompressed."""
+        try:
+            data = head(cls.header_size or DEFAULT_HEADER_SIZE)
+        except (OSError, EOFError, lzma.LZMAError, zlib.error):
+            return None
+        return cls.of_str(_sniff_buffer(data), _compression_encodings[compression])
+
+    @classmethod
+    def _name_for_compressed(cls, mime: 'MimeType', path: Optional[PurePath]) -> 'MimeType':
+        if path is None or mime.extract_compression() is None:
             return mime
         return cls.of_name(path)
 
+    @classmethod
+    def _sniff(cls, path: Path) -> str:
+        if cls.header_size is None and not cls.signatures:
+            cls.sniff_stats.count(signature=False)
+            return cls.magic_pool.from_file(path)
+        try:
+            head = read_header(path, cls.header_size or HEAD_SIZE, follow_symlinks=False)
+        except OSError as err:
+            if err.errno != errno.ELOOP:
+                raise
+            # a symlink, which libmagic reports as such rather than following;
+            # a dangling one fails to open there, and here
+            os.stat(path)
+            return str(cls.Symlink)
+        if cls.header_size is not None:
+            return _sniff_buffer(head)
+        mime_str = sniff_signature(head)
+        cls.sniff_stats.count(signature=mime_str is not None)
+        return cls.magic_pool.from_file(path) if mime_str is None else mime_str
+
+    @classmethod
+    def _detect(cls, path: Path) -> str:
+        if cls.cache is None:
+            return cls._sniff(path)
+        cls.cache.use_settings(
+            (cls.header_size, cls.signatures, cls.magic_pool.flags, cls.magic_pool.magic_file)
+        )
+        # libmagic does not follow symlinks, so neither does the key
+        st = os.lstat(path)
+        mime_str = cls.cache.get(st)
+        if mime_str is None:
+            mime_str = cls._sniff(path)
+            cls.cache.put(st, mime_str)
+        return mime_str
+
     @classmethod
     def of_name(cls, path: PurePath) -> 'MimeType':
         if path.suffix == '':
             return cls.Extensionless
-        mime = mimetypes.guess_type(str(path), strict=False)
-        if mime is None:
-            return cls.Unknown
-        return cls.of_str(*mime)
+        return cls.of_str(*cls.extension_index().guess(path.name))
 
     def __str__(self):
-        comp_str = "" if self.compression is None else f"!{self.compression}"
-        return f"{self.type}/{self.format}{comp_str}"
+        return self._str
 
     def extract_compression(self) -> Optional[str]:
         return _compressed_from_mimes.get(self)
 
-    def extensions(self) -> Set[str]:
-        if self == self.Extensionless:
-            return set()
-        exlist = mimetypes.guess_all_extensions(str(self), strict=False)
-        return set(ext[1:] for ext in exlist)
+    def uncompressed(self) -> 'MimeType':
+        return self if self.compression is None else MimeType(self.type, self.format)
+
+    def compression_extension(self) -> Optional[str]:
+        if self.compression is None:
+            return None
+        return self.extension_index().encoding_extension(self.compression)
+
+    def extensions(self) -> FrozenSet[str]:
+        if self is self.Extensionless:
+            return frozenset()
+        return self.extension_index().extension_set(str(self))
 
     def extension(self) -> Optional[str]:
         if self in self.preferred_ext:
             return self.preferred_ext[self]
 
-        if self == self.Extensionless:
+        if self is self.Extensionless:
             return None
 
-        ext = mimetypes.guess_extension(str(self), strict=False)
-        return None if ext is None else ext[1:]
+        return self._first_extension()
+
+    def _first_extension(self) -> Optional[str]:
+        exts = self.extension_index().extensions_of(str(self))
+        return exts[0] if exts else None
 
     def correct_extension(self, ext: str) -> Optional[str]:
         if self in self.preferred_ext:
@@ -118,8 +308,7 @@ class MimeType:
         if ext in self.extensions():
             return ext
 
-        new_ext = mimetypes.guess_extension(str(self), strict=False)
-        return None if new_ext is None else new_ext[1:]
+        return self._first_extension()
 
 
 # Filesystem MimeTypes
@@ -134,6 +323,8 @@ MimeType.Binary = MimeType("application", "octet-stream")
 MimeType.Extensionless = MimeType("_")
 MimeType.PlainText = MimeType("text", "plain")
 
+MimeType.ExtensionOptional = frozenset()
+
 MimeType.Compressed = {
     "xz"   : MimeType("application", "x-xz"),
     "bz2"  : MimeType("application", "x-bzip2"),
@@ -141,3 +332,35 @@ MimeType.Compressed = {
 }
 
 _compressed_from_mimes = {v: k for k, v in MimeType.Compressed.items()}
+
+# Compression, as keyed in `MimeType.Compressed`, to the encoding `mimetypes`
+# names for the extension.
+_compression_encodings = {"gzip": "gzip", "bz2": "bzip2", "xz": "xz"}
+
+_openers: Dict[str, Callable] = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+
+def _read_decompressed(path: Path, compression: str, size: int) -> bytes:
+    """Up to `size` leading bytes of a compressed file's contents,
+    decompressing only as much of it as they take."""
+    with _openers[compression](path, 'rb') as fh:
+        return fh.read(size)
+
+
+def decompress_head(data: bytes, compression: str, size: int) -> bytes:
+    """Up to `size` leading bytes of compressed `data`, which may be only a
+    prefix of the compressed stream."""
+    if compression == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(data, size)
+    if compression == "bz2":
+        return bz2.BZ2Decompressor().decompress(data, size)
+    return lzma.LZMADecompressor().decompress(data, size)
+
+
+def _sniff_buffer(data: bytes) -> str:
+    # libmagic reports empty buffers as application/x-empty, files as inodes
+    if len(data) == 0:
+        return str(MimeType.Empty)
+    mime_str = sniff_signature(data) if MimeType.signatures else None
+    MimeType.sniff_stats.count(signature=mime_str is not None)
+    return MimeType.magic_pool.from_buffer(data) if mime_str is None else mime_str
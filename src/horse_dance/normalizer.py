@@ -1,14 +1,14 @@
 """Normalizing filenames"""
 from dataclasses import dataclass, field
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path, PurePath
-from typing import Optional, Tuple, List
+from typing import Optional, Tuple, List, Iterable, Iterator, Callable
 import re
 import logging
-import yaml
-
-from slugify import slugify  # type: ignore
 
 from horse_dance.mime_types import MimeType
+from horse_dance.slugs import Slugger
 from horse_dance.mime_resolver import Mimes, MimeResolver, Matched, Extensionless
 
 
@@ -60,46 +60,92 @@ class Normalizer:
         path_root = config.get("path_root")
         if path_root is not None:
             self.path_root = PurePath(path_root)
+
+        self.slug = Slugger(
+            config.get('slug_engine', 'fast'), config.get('slug_cache_size', 1 << 16)
+        )
    
     def _make_slug(self, stem: str) -> str:
-        return slugify(stem)
+        return self.slug(stem)
 
     def _is_nondescript(self, stem: str) -> bool:
         re_term = (
             False if self.non_descript_re is None
-            else re.match(self.non_descript_re, stem) is not None
+            else self.non_descript_re.match(stem) is not None
         )
         return len(stem) <= 3 or re_term
 
-    def _disambiguate(self, stem: str, path: PurePath) -> str:
+    def _parent_suffix(self, parent: PurePath) -> str:
+        if self.path_root is not None and (
+            parent == self.path_root or self.path_root in parent.parents
+        ):
+            path_to = parent.relative_to(self.path_root)
+        else:
+            path_to = parent
+        return self.slug("-".join(path_to.parts))
+
+    def _disambiguate(
+        self, stem: str, path: PurePath,
+        parent_suffix: Optional[Callable[[PurePath], str]] = None,
+    ) -> str:
         if not self._is_nondescript(stem):
             return stem
-        if self.path_root is not None and self.path_root in path.parents:
-            path_to = path.parent.relative_to(self.path_root)
-        else:
-            path_to = path.parent
-        suffix = slugify("-".join(path_to.parts))
-        return f"{stem}--{suffix}"
+        if parent_suffix is None:
+            parent_suffix = self._parent_suffix
+        return f"{stem}--{parent_suffix(path.parent)}"
 
     def slugger(self, path: PurePath) -> str:
         stem = self._make_slug(path.stem)
         return self._disambiguate(stem, path)
 
     def __call__(self, path: PurePath, mime: Optional[MimeType] = None) -> FileInfo:
+        return self._normalize(path, mime, self._make_slug, self._parent_suffix)
+
+    def normalize_many(
+        self,
+        paths: Iterable[PurePath],
+        mimes: Optional[Iterable[Optional[MimeType]]] = None,
+        cache_size: int = 4096,
+    ) -> Iterator[FileInfo]:
+        """Normalize a stream of paths, paired with a stream of mimes if given.
+
+        Per-directory disambiguation suffixes are memoized over the stream, so
+        siblings share the work on their parent directory.
+        """
+        parent_suffix = lru_cache(maxsize=cache_size)(self._parent_suffix)
+        for path, mime in zip(paths, repeat(None) if mimes is None else mimes):
+            yield self._normalize(path, mime, self._make_slug, parent_suffix)
+
+    def _normalize(
+        self,
+        path: PurePath,
+        mime: Optional[MimeType],
+        make_slug: Callable[[str], str],
+        parent_suffix: Callable[[PurePath], str],
+    ) -> FileInfo:
+        original_name = FileName.of_path(path) 
+        inner_name = original_name
+        comp_ext = None
         if mime is not None and mime.compression is not None:
-            raise NotImplementedError()
+            comp_ext = mime.compression_extension()
+            if comp_ext is None:
+                raise ValueError(f"no extension known for {mime.compression} compression")
+            if original_name.ext == comp_ext:
+                inner_name = FileName.of_path(PurePath(original_name.stem))
+            mime = mime.uncompressed()
 
-        original_name = FileName.of_path(path) 
-        raw_stem = self._make_slug(original_name.stem)
-        new_stem = self._disambiguate(raw_stem, path)
+        raw_stem = make_slug(inner_name.stem)
+        new_stem = self._disambiguate(raw_stem, path, parent_suffix)
 
         if mime is None:
             normalized_name = FileName(new_stem, original_name.ext)
             return FileInfo(path, original_name, normalized_name, raw_stem)
 
-        ext = mime.correct_extension(original_name.ext)
+        ext = mime.correct_extension(inner_name.ext)
         if ext is None:
             return FileInfo(path, original_name)
 
+        if comp_ext is not None:
+            ext = comp_ext if ext == "" else f"{ext}.{comp_ext}"
         normalized_name = FileName(new_stem, ext)
         return FileInfo(path, original_name, normalized_name, raw_stem)
@@ -0,0 +1,283 @@
+"""Planning and applying renames to normalized names."""
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path, PurePath
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import sys
+
+from horse_dance.normalizer import FileInfo, FileName
+
+_DIR_FD_RENAME = os.rename in os.supports_dir_fd
+
+AT_FDCWD = -100
+RENAME_NOREPLACE = 1
+
+
+def _load_renameat2():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        renameat2 = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+@dataclass(frozen=True)
+class Rename:
+    directory: PurePath
+    source: str
+    target: str
+
+
+def _listdir(directory: PurePath) -> Iterable[str]:
+    try:
+        return os.listdir(directory)
+    except FileNotFoundError:
+        return ()
+
+
+def plan_renames(
+    infos: Iterable[FileInfo],
+    existing: Callable[[PurePath], Iterable[str]] = _listdir,
+) -> Iterator[Rename]:
+    """Renames of files to their normalized names, in input order.
+
+    Each target directory's names, as listed by `existing`, are indexed the
+    first time the directory is seen, and the names of inputs and targets of
+    earlier renames are claimed as they come. A target colliding with a
+    claimed name gets the first free numbered suffix, `stem-1.ext`,
+    `stem-2.ext` and so on. Names vacated by renames
+    are not reused, so a plan never depends on the order it is applied in.
+    """
+    taken: Dict[PurePath, Set[str]] = {}
+    for info in infos:
+        directory = info.path.parent
+        source = info.path.name
+        names = taken.get(directory)
+        if names is None:
+            names = taken[directory] = set(existing(directory))
+        # every input holds its name, renamed or not
+        names.add(source)
+        if info.normalized_name is None:
+            continue
+        target = str(info.normalized_name)
+        if target == source:
+            continue
+        n = 0
+        while target in names:
+            n += 1
+            name = info.normalized_name
+            target = str(FileName(f"{name.stem}-{n}", name.ext))
+        names.add(target)
+        yield Rename(directory, source, target)
+
+
+def _at(directory: PurePath, name: str, dir_fd: Optional[int]):
+    return directory / name if dir_fd is None else name
+
+
+def _lstat(directory: PurePath, name: str, dir_fd: Optional[int]) -> Optional[os.stat_result]:
+    try:
+        return os.stat(_at(directory, name, dir_fd), dir_fd=dir_fd, follow_symlinks=False)
+    except FileNotFoundError:
+        return None
+
+
+def _lexists(directory: PurePath, name: str, dir_fd: Optional[int]) -> bool:
+    return _lstat(directory, name, dir_fd) is not None
+
+
+def _rename_noreplace(directory: PurePath, source: str, target: str, dir_fd: Optional[int]):
+    src = _at(directory, source, dir_fd)
+    dst = _at(directory, target, dir_fd)
+    if _renameat2 is not None:
+        fd = AT_FDCWD if dir_fd is None else dir_fd
+        if _renameat2(fd, os.fsencode(src), fd, os.fsencode(dst), RENAME_NOREPLACE) == 0:
+            return
+        err = ctypes.get_errno()
+        # EINVAL: the filesystem does not take the flag
+        if err not in (errno.EINVAL, errno.ENOSYS):
+            raise OSError(err, os.strerror(err), str(directory / target))
+    try:
+        # linking fails on an existing target, where renaming would replace it
+        os.link(src, dst, src_dir_fd=dir_fd, dst_dir_fd=dir_fd, follow_symlinks=False)
+    except OSError as e:
+        if e.errno not in (errno.EPERM, errno.EXDEV, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP):
+            raise
+        # no hard links here, or to directories: check, then rename
+        if _lexists(directory, target, dir_fd):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), str(directory / target))
+        os.rename(src, dst, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+        return
+    os.unlink(src, dir_fd=dir_fd)
+
+
+def _rename(directory: PurePath, source: str, target: str, dir_fd: Optional[int]):
+    """Rename within a directory without replacing an existing target. A
+    rename found already made is left as is, and one interrupted between
+    linking the target and unlinking the source is finished."""
+    try:
+        _rename_noreplace(directory, source, target, dir_fd)
+    except (FileExistsError, FileNotFoundError):
+        target_st = _lstat(directory, target, dir_fd)
+        if target_st is None:
+            raise
+        source_st = _lstat(directory, source, dir_fd)
+        if source_st is None:
+            return
+        if not (os.path.samestat(source_st, target_st) and source_st.st_nlink > 1):
+            raise
+        os.unlink(_at(directory, source, dir_fd), dir_fd=dir_fd)
+
+
+def _complete(line: bytes) -> bool:
+    if not line.endswith(b"\n"):
+        return False
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+class RenameJournal:
+    """An append-only, fsynced log of planned and applied renames.
+
+    `record` writes a plan to the journal and `apply` carries it out in
+    batches, logging each batch as done once its renames are made. After an
+    interruption, `apply` on the same journal resumes with the renames not
+    yet logged, and `rollback` reverses the applied ones; neither rescans the
+    tree. Each line is a JSON array: `["R", dir, source, target]` for a
+    planned rename, `["D", i]` or `["U", i]` for the i-th one done or undone.
+    """
+
+    def __init__(self, path, batch_size: int = 256):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.renames: List[Rename] = []
+        self.done: List[bool] = []
+        if self.path.exists():
+            self._read()
+
+    def _read(self):
+        with open(self.path, "rb") as fh:
+            lines = fh.readlines()
+        if lines and not _complete(lines[-1]):
+            # torn by an interruption while appending; it never took effect,
+            # so cut it off before anything is appended after it
+            os.truncate(self.path, sum(map(len, lines[:-1])))
+            lines.pop()
+        for line in lines:
+            entry = json.loads(line)
+            if entry[0] == "R":
+                self.renames.append(Rename(PurePath(entry[1]), entry[2], entry[3]))
+                self.done.append(False)
+            else:
+                self.done[entry[1]] = entry[0] == "D"
+
+    def _append(self, entries: Iterable[list]):
+        with open(self.path, "a") as fh:
+            for entry in entries:
+                fh.write(json.dumps(entry) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def record(self, renames: Iterable[Rename]) -> int:
+        """Add renames to the plan, returning how many were added."""
+        added = 0
+        renames = iter(renames)
+        while True:
+            batch = list(islice(renames, self.batch_size * 16))
+            if not batch:
+                return added
+            self._append(["R", str(r.directory), r.source, r.target] for r in batch)
+            self.renames.extend(batch)
+            self.done.extend(False for _ in batch)
+            added += len(batch)
+
+    def pending(self) -> List[int]:
+        return [i for i, done in enumerate(self.done) if not done]
+
+    def apply(self) -> int:
+        """Apply the renames not yet done, returning how many were applied.
+
+        A rename found already made on disk, because the run was interrupted
+        before logging it, is logged without being repeated. A target that
+        exists alongside its source is never replaced; `FileExistsError` is
+        raised instead, after logging the renames made so far.
+        """
+        applied = 0
+        pending = self.pending()
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            try:
+                for i in self._in_directories(batch, reverse=False):
+                    self.done[i] = True
+                    applied += 1
+            finally:
+                self._log_batch(batch, True)
+        return applied
+
+    def _made(self, i: int) -> bool:
+        rename = self.renames[i]
+        return (
+            _lexists(rename.directory, rename.target, None)
+            and not _lexists(rename.directory, rename.source, None)
+        )
+
+    def rollback(self) -> int:
+        """Undo the applied renames, most recent first.
+
+        As in `apply`, a pending rename found made on disk, because the run
+        was interrupted before logging it, counts as applied and is undone.
+        Only the batch `apply` would take first can hold such renames, as
+        every batch before it was logged; later pending renames whose target
+        merely exists without their source are left alone.
+        """
+        undone = 0
+        unlogged = [i for i in self.pending()[:self.batch_size] if self._made(i)]
+        applied = sorted([i for i, done in enumerate(self.done) if done] + unlogged, reverse=True)
+        for start in range(0, len(applied), self.batch_size):
+            batch = applied[start:start + self.batch_size]
+            try:
+                for i in self._in_directories(batch, reverse=True):
+                    self.done[i] = False
+                    undone += 1
+            finally:
+                self._log_batch(batch, False)
+        return undone
+
+    def _log_batch(self, batch: List[int], done: bool):
+        tag = "D" if done else "U"
+        self._append([tag, i] for i in batch if self.done[i] == done)
+
+    def _in_directories(self, batch: List[int], reverse: bool) -> Iterator[int]:
+        dir_fd: Optional[int] = None
+        directory: Optional[PurePath] = None
+        try:
+            for i in batch:
+                rename = self.renames[i]
+                if _DIR_FD_RENAME and rename.directory != directory:
+                    if dir_fd is not None:
+                        os.close(dir_fd)
+                        dir_fd = None
+                    dir_fd = os.open(rename.directory, os.O_RDONLY | os.O_DIRECTORY)
+                    directory = rename.directory
+                if reverse:
+                    _rename(rename.directory, rename.target, rename.source, dir_fd)
+                else:
+                    _rename(rename.directory, rename.source, rename.target, dir_fd)
+                yield i
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
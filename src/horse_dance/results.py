@@ -0,0 +1,281 @@
+"""Scan results held in flat columns, for trees of millions of files.
+
+Rather than a `Path`, `Mimes` and `FileName` per file, results keep a table
+of directories, concatenated basenames, and integer codes into tables of
+mimes and resolution rules. Results are built up from `(path, mimes,
+normalized name)` triples, such as `scan_sharded` yields, and materialized
+again only when read. Saved results are memory-mapped back on load.
+"""
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
+import json
+import mmap
+import struct
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolution, MimeResolver, Mimes, NameOnly
+from horse_dance.normalizer import FileInfo, FileName
+
+try:
+    import numpy  # type: ignore
+except ImportError:
+    numpy = None  # type: ignore
+
+RESULTS_VERSION = 1
+
+_MAGIC = b"HDRESULT"
+_header_size = struct.Struct("<Q")
+_ALIGN = 8
+
+RULES: List[Type[MimeResolution]] = [NameOnly] + MimeResolver.resolvers
+_rule_codes = {rule: i for i, rule in enumerate(RULES)}
+
+Result = Tuple[Path, Mimes, Optional[FileName]]
+
+# row indices, from NumPy when it is installed
+Rows = Union[Sequence[int], 'numpy.ndarray']
+Column = Union[bytearray, array, memoryview]
+
+
+class _Strings:
+    """Strings concatenated as UTF-8, with the offset each one ends at."""
+
+    def __init__(self, data=None, ends=None):
+        self.data = bytearray() if data is None else data
+        self.ends = array('q') if ends is None else ends
+        self.codes: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, i: int) -> str:
+        start = self.ends[i - 1] if i > 0 else 0
+        return str(self.data[start:self.ends[i]], 'utf-8', 'surrogateescape')
+
+    def append(self, value: str) -> int:
+        self.data += value.encode('utf-8', 'surrogateescape')
+        self.ends.append(len(self.data))
+        return len(self.ends) - 1
+
+    def code(self, value: str) -> int:
+        """The index of `value`, appending it if it is new."""
+        if self.codes is None:
+            self.codes = {self[i]: i for i in range(len(self))}
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = self.append(value)
+        return code
+
+
+def _mime_value(mime: MimeType) -> list:
+    return [mime.type, mime.format, mime.compression]
+
+
+def _name_value(name: Optional[FileName]) -> str:
+    # neither part of a file name can hold a '/', so '' stands for None
+    return "" if name is None else f"{name.stem}/{name.ext}"
+
+
+class ScanResults:
+    """Columns of scan results, appended to while scanning, or loaded from a
+    saved file as read-only views of its memory map.
+
+    Filters such as `unresolved()` and `by_rule(CorrectFormat)` compare whole
+    code columns, with NumPy when it is installed, and give row indices.
+    """
+
+    def __init__(self):
+        self.dirs = _Strings()
+        self.names = _Strings()
+        self.normalized = _Strings()
+        self.dir = array('i')
+        self.file = array('i')
+        self.name = array('i')
+        self.rule = array('b')
+        self.resolved = array('i')
+        self.mimes: List[MimeType] = []
+        self._mime_codes: Dict[MimeType, int] = {}
+        self._mmap: Optional[mmap.mmap] = None
+        self._views: List[memoryview] = []
+
+    def __len__(self) -> int:
+        return len(self.rule)
+
+    def _mime_code(self, mime: Optional[MimeType]) -> int:
+        if mime is None:
+            return -1
+        code = self._mime_codes.get(mime)
+        if code is None:
+            code = self._mime_codes[mime] = len(self.mimes)
+            self.mimes.append(mime)
+        return code
+
+    def append(self, path: Path, mimes: Mimes, normalized_name: Optional[FileName] = None):
+        if self._mmap is not None:
+            raise ValueError("loaded results are read-only")
+        resolved = mimes.resolved
+        self.dir.append(self.dirs.code(str(path.parent)))
+        self.names.append(path.name)
+        self.normalized.append(_name_value(normalized_name))
+        self.file.append(self._mime_code(mimes.file))
+        self.name.append(self._mime_code(mimes.name))
+        self.rule.append(-1 if resolved is None else _rule_codes[type(resolved)])
+        self.resolved.append(-1 if resolved is None else self._mime_code(resolved.mime))
+
+    def extend(self, results: Iterable[Result]):
+        for path, mimes, normalized_name in results:
+            self.append(path, mimes, normalized_name)
+
+    @staticmethod
+    def of_results(results: Iterable[Result]) -> 'ScanResults':
+        store = ScanResults()
+        store.extend(results)
+        return store
+
+    def path(self, i: int) -> Path:
+        return Path(self.dirs[self.dir[i]], self.names[i])
+
+    def resolution(self, i: int) -> Optional[MimeResolution]:
+        rule = self.rule[i]
+        if rule < 0:
+            return None
+        return RULES[rule].of_mime(self.mimes[self.resolved[i]])
+
+    def get_mimes(self, i: int) -> Mimes:
+        return Mimes(self.mimes[self.file[i]], self.mimes[self.name[i]], self.resolution(i))
+
+    def normalized_name(self, i: int) -> Optional[FileName]:
+        value = self.normalized[i]
+        if value == "":
+            return None
+        stem, ext = value.split("/")
+        return FileName(stem, ext)
+
+    def info(self, i: int) -> FileInfo:
+        path = self.path(i)
+        return FileInfo(path, FileName.of_path(path), self.normalized_name(i))
+
+    def __getitem__(self, i: int) -> Result:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.path(i), self.get_mimes(i), self.normalized_name(i)
+
+    def __iter__(self) -> Iterator[Result]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def rows(self, indices: Iterable[int]) -> Iterator[Result]:
+        for i in indices:
+            yield self[int(i)]
+
+    def _where(self, column, code: int) -> Rows:
+        if numpy is not None:
+            return numpy.flatnonzero(numpy.frombuffer(column, dtype=_typecode(column)) == code)
+        return array('q', (i for i, c in enumerate(column) if c == code))
+
+    def unresolved(self) -> Rows:
+        return self._where(self.rule, -1)
+
+    def by_rule(self, rule: Type[MimeResolution]) -> Rows:
+        return self._where(self.rule, _rule_codes[rule])
+
+    def by_mime(self, mime: MimeType, column: str = 'resolved') -> Rows:
+        """Rows whose `column`, one of 'file', 'name' or 'resolved', is `mime`."""
+        code = self._mime_codes.get(mime)
+        if code is None:
+            return array('q')
+        return self._where(getattr(self, column), code)
+
+    def _columns(self) -> Dict[str, Column]:
+        return {
+            'dirs.data': self.dirs.data, 'dirs.ends': self.dirs.ends,
+            'names.data': self.names.data, 'names.ends': self.names.ends,
+            'normalized.data': self.normalized.data, 'normalized.ends': self.normalized.ends,
+            'dir': self.dir, 'file': self.file, 'name': self.name,
+            'rule': self.rule, 'resolved': self.resolved,
+        }
+
+    def save(self, path: Union[str, Path]):
+        """Write the columns, each aligned to 8 bytes, after a JSON header
+        giving their offsets and the mime and rule tables."""
+        columns = self._columns()
+        buffers = {key: memoryview(column).cast('B') for key, column in columns.items()}
+        layout = {}
+        offset = 0
+        for key, buf in buffers.items():
+            layout[key] = [_typecode(columns[key]), offset, len(buf)]
+            offset += len(buf) + -len(buf) % _ALIGN
+        header = json.dumps(dict(
+            version=RESULTS_VERSION,
+            mimes=[_mime_value(m) for m in self.mimes],
+            rules=[rule.__name__ for rule in RULES],
+            columns=layout,
+        )).encode()
+        header += b" " * (-(len(_MAGIC) + _header_size.size + len(header)) % _ALIGN)
+        with open(path, 'wb') as fh:
+            fh.write(_MAGIC + _header_size.pack(len(header)) + header)
+            for buf in buffers.values():
+                fh.write(buf)
+                fh.write(b"\0" * (-len(buf) % _ALIGN))
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> 'ScanResults':
+        """Memory-map saved results; columns are read from the file as
+        they are used, and stay valid until `close`."""
+        with open(path, 'rb') as fh:
+            mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        if bytes(view[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"{path} is not saved scan results")
+        start = len(_MAGIC) + _header_size.size
+        (length,) = _header_size.unpack_from(mapped, len(_MAGIC))
+        header = json.loads(bytes(view[start:start + length]))
+        if header['version'] != RESULTS_VERSION:
+            raise ValueError(f"unsupported results version {header['version']}")
+        if header['rules'] != [rule.__name__ for rule in RULES]:
+            raise ValueError("results were saved with different resolution rules")
+        base = start + length
+
+        results = ScanResults()
+
+        def column(key: str) -> memoryview:
+            typecode, offset, size = header['columns'][key]
+            col = view[base + offset:base + offset + size].cast(typecode)
+            results._views.append(col)
+            return col
+
+        results.dirs = _Strings(column('dirs.data'), column('dirs.ends'))
+        results.names = _Strings(column('names.data'), column('names.ends'))
+        results.normalized = _Strings(column('normalized.data'), column('normalized.ends'))
+        for key in ('dir', 'file', 'name', 'rule', 'resolved'):
+            setattr(results, key, column(key))
+        results.mimes = [MimeType(*value) for value in header['mimes']]
+        results._mime_codes = {mime: i for i, mime in enumerate(results.mimes)}
+        results._views.append(view)
+        results._mmap = mapped
+        return results
+
+    def close(self):
+        """Release the memory map of loaded results."""
+        if self._mmap is not None:
+            while self._views:
+                self._views.pop().release()
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> 'ScanResults':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _typecode(column) -> str:
+    if isinstance(column, array):
+        return column.typecode
+    if isinstance(column, memoryview):
+        return column.format
+    return 'B'
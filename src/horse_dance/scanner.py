@@ -0,0 +1,69 @@
+"""Walking directory trees without re-statting entries."""
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Iterable, Iterator, Optional, Tuple, TypeVar
+import os
+
+from horse_dance.mime_types import MimeType
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+OnError = Optional[Callable[[OSError], None]]
+
+
+def walk(
+    root: Path, follow_symlinks: bool = False, onerror: OnError = None, recursive: bool = True
+) -> Iterator[Tuple[Path, Optional[MimeType]]]:
+    """Yield every path under `root` with its inode mime when the `DirEntry`
+    already tells us what it is, or `None` when its contents need detection.
+    Without `recursive`, only the entries of `root` itself."""
+    stack = [root]
+    while stack:
+        top = stack.pop()
+        try:
+            with os.scandir(top) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as err:
+            if onerror is not None:
+                onerror(err)
+            continue
+
+        subdirs = []
+        for entry in entries:
+            path = top / entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                yield path, MimeType.Dir
+                if recursive and (follow_symlinks or not entry.is_symlink()):
+                    subdirs.append(path)
+            else:
+                yield path, None
+        stack.extend(reversed(subdirs))
+
+
+def bounded_submit(
+    fn: Callable[[T], R], items: Iterable[T], executor: Executor, window: int
+) -> Iterator[Tuple[T, 'Future[R]']]:
+    """Like `Executor.map`, but keeps at most `window` tasks in flight so
+    arbitrarily long inputs are consumed lazily. Yields each item with its
+    finished future, in input order."""
+    pending: Deque[Tuple[T, Future]] = deque()
+    for item in items:
+        pending.append((item, executor.submit(fn, item)))
+        if len(pending) >= window:
+            item, future = pending.popleft()
+            future.exception()
+            yield item, future
+    while pending:
+        item, future = pending.popleft()
+        future.exception()
+        yield item, future
+
+
+def default_executor(workers: Optional[int] = None) -> Executor:
+    return ThreadPoolExecutor(max_workers=workers)
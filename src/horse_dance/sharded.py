@@ -0,0 +1,188 @@
+"""Scanning very large trees over several processes.
+
+Resolution and normalization are pure Python, so threads stop helping once
+the filesystem keeps up. Here the tree is cut into shards at its top-level
+directories, each shard resolved and normalized in a worker process, and
+the results merged back in walk order.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+import os
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver, Mimes, NameOnly
+from horse_dance.normalizer import FileName, Normalizer
+from horse_dance.scanner import OnError, bounded_submit, walk
+
+# a directory relative to the root, and whether to walk beneath it
+Shard = Tuple[str, bool]
+
+# path relative to the shard, file mime, name mime, rule, resolved mime,
+# normalized stem and extension; or just the error met at that point
+Row = tuple
+
+_rules = [NameOnly] + MimeResolver.resolvers
+_rule_codes = {rule: i for i, rule in enumerate(_rules)}
+
+
+def _join(rel: str, name: str) -> str:
+    return f"{rel}/{name}" if rel else name
+
+
+def _subdirs(directory: Path, follow_symlinks: bool) -> Optional[List[str]]:
+    """The subdirectories `walk` would descend into, or `None` if
+    `directory` cannot be listed."""
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return None
+    subdirs = []
+    for entry in entries:
+        try:
+            if entry.is_dir() and (follow_symlinks or not entry.is_symlink()):
+                subdirs.append(entry.name)
+        except OSError:
+            pass
+    return subdirs
+
+
+def shards(root: Path, count: int, follow_symlinks: bool = False) -> List[Shard]:
+    """Shards covering `walk(root)`, in its order. The root is split into
+    its own entries and a shard per subdirectory, and shards are split the
+    same way, a level at a time, until there are at least `count`."""
+    tasks: List[Shard] = [("", True)]
+    while True:
+        split: List[Shard] = []
+        deeper = False
+        for rel, recursive in tasks:
+            subdirs = _subdirs(root / rel, follow_symlinks) if recursive else None
+            if subdirs is None:
+                split.append((rel, recursive))
+                continue
+            split.append((rel, False))
+            split.extend((_join(rel, name), True) for name in subdirs)
+            deeper = deeper or bool(subdirs)
+        tasks = split
+        if not deeper or len(tasks) >= count:
+            return tasks
+
+
+class _Worker:
+    def __init__(
+        self,
+        root: Path,
+        resolver: MimeResolver,
+        normalizer: Normalizer,
+        name_only: bool,
+        follow_symlinks: bool,
+        walk_errors: bool,
+    ):
+        self.root = root
+        self.resolver = resolver
+        self.normalizer = normalizer
+        self.name_only = name_only
+        self.follow_symlinks = follow_symlinks
+        self.walk_errors = walk_errors
+
+    def run(self, shard: Shard) -> List[Row]:
+        rel, recursive = shard
+        top = self.root / rel
+        prefix = len(str(top)) + 1
+        rows: List[Row] = []
+        onerror = (lambda err: rows.append((err,))) if self.walk_errors else None
+        for path, inode in walk(top, self.follow_symlinks, onerror, recursive):
+            try:
+                if self.name_only:
+                    mimes = self.resolver.resolve_path(path, ignore_file=True)
+                else:
+                    mimes = self.resolver.resolve_file(path, inode)
+            except OSError as err:
+                rows.append((err,))
+                continue
+            rel_path = str(path)[prefix:]
+            resolved = mimes.resolved
+            if resolved is None:
+                rows.append((rel_path, mimes.file, mimes.name, -1, None, None, None))
+                continue
+            name = self.normalizer(path, resolved.mime).normalized_name
+            stem, ext = (None, None) if name is None else (name.stem, name.ext)
+            rows.append((
+                rel_path, mimes.file, mimes.name, _rule_codes[type(resolved)], resolved.mime, stem, ext
+            ))
+        return rows
+
+
+_worker: Optional[_Worker] = None
+
+
+def _init_worker(
+    mime_config: Optional[dict],
+    root: Path,
+    resolver_config: Optional[dict],
+    normalizer_config: Optional[dict],
+    name_only: bool,
+    follow_symlinks: bool,
+    walk_errors: bool,
+):
+    global _worker  # pylint: disable=global-statement
+    if mime_config is not None:
+        MimeType.initialize(mime_config)
+    _worker = _Worker(
+        root, MimeResolver(resolver_config), Normalizer(normalizer_config),
+        name_only, follow_symlinks, walk_errors,
+    )
+
+
+def _run(shard: Shard) -> List[Row]:
+    assert _worker is not None
+    return _worker.run(shard)
+
+
+def scan_sharded(
+    root: Path,
+    mime_config: Optional[dict] = None,
+    resolver_config: Optional[dict] = None,
+    normalizer_config: Optional[dict] = None,
+    workers: Optional[int] = None,
+    name_only: bool = False,
+    follow_symlinks: bool = False,
+    onerror: OnError = None,
+    shards_per_worker: int = 4,
+) -> Iterator[Tuple[Path, Mimes, Optional[FileName]]]:
+    """Resolve and normalize every path under `root` over `workers`
+    processes, yielding each with its mimes and normalized name in walk
+    order, as `MimeResolver.scan` does.
+
+    Each worker is set up once with `MimeType.initialize(mime_config)` and
+    the resolver and normalizer configs, and returns a shard's results as
+    one batch of plain rows. With `name_only`, files are not opened.
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = shards(root, workers * shards_per_worker, follow_symlinks)
+    with ProcessPoolExecutor(
+        workers,
+        initializer=_init_worker,
+        initargs=(
+            mime_config, root, resolver_config, normalizer_config,
+            name_only, follow_symlinks, onerror is not None,
+        ),
+    ) as executor:
+        for (rel, _), future in bounded_submit(_run, tasks, executor, 2 * workers):
+            top = root / rel
+            for row in future.result():
+                if len(row) == 1:
+                    if onerror is None:
+                        raise row[0]
+                    onerror(row[0])
+                    continue
+                path, file_mime, name_mime, rule, resolved, stem, ext = row
+                if rule < 0:
+                    yield top / path, Mimes(file_mime, name_mime), None
+                    continue
+                yield (
+                    top / path,
+                    Mimes(file_mime, name_mime, _rules[rule].of_mime(resolved)),
+                    None if stem is None else FileName(stem, ext),
+                )
@@ -0,0 +1,145 @@
+"""Recognizing common media formats from their leading bytes, before libmagic.
+
+Only signatures that libmagic reports a single way are here, each with the
+mime string libmagic gives for it; anything else is left to libmagic.
+Containers are looked into as far as telling their formats apart needs:
+the RIFF form type, the ISO base media `ftyp` brand, the EBML DocType and
+the codec of an Ogg stream's first packet.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+import threading
+
+# enough for every signature below, including an EBML header's DocType
+HEAD_SIZE = 256
+
+# (offset, magic bytes, mime, the fewest bytes libmagic needs to agree);
+# ID3 tags are not here, since they precede FLAC and AAC as well as MP3
+_MAGIC: List[Tuple[int, bytes, str, int]] = [
+    (0, b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR", "image/png", 16),
+    (0, b"\xff\xd8\xff", "image/jpeg", 4),
+    (0, b"GIF87a", "image/gif", 6),
+    (0, b"GIF89a", "image/gif", 6),
+    (0, b"fLaC", "audio/flac", 4),
+    (0, b"%PDF-", "application/pdf", 5),
+    (0, b"FLV\x01", "video/x-flv", 4),
+    (0, b"MThd\x00\x00\x00\x06", "audio/midi", 8),
+    (0, b"0&\xb2u\x8ef\xcf\x11\xa6\xd9\x00\xaa\x00b\xcel", "video/x-ms-asf", 16),
+]
+
+_RIFF = {b"WEBP": "image/webp", b"WAVE": "audio/x-wav", b"AVI ": "video/x-msvideo"}
+_IFF = {b"AIFF": "audio/x-aiff"}
+
+_FTYP = {
+    b"isom": "video/mp4",
+    b"mp41": "video/mp4",
+    b"mp42": "video/mp4",
+    b"qt  ": "video/quicktime",
+    b"M4A ": "audio/x-m4a",
+}
+
+_EBML = {b"webm": "video/webm", b"matroska": "video/x-matroska"}
+
+_OGG = (b"\x01vorbis", b"OpusHead", b"\x7fFLAC")
+
+
+def _riff(data: bytes) -> Optional[str]:
+    return _RIFF.get(data[8:12])
+
+
+def _iff(data: bytes) -> Optional[str]:
+    return _IFF.get(data[8:12])
+
+
+def _ftyp(data: bytes) -> Optional[str]:
+    if data[4:8] != b"ftyp":
+        return None
+    return _FTYP.get(data[8:12])
+
+
+def _vint(data: bytes, pos: int, keep_marker: bool = False) -> Optional[Tuple[int, int]]:
+    """An EBML variable length integer at `pos`, and the position after it."""
+    if pos >= len(data) or data[pos] == 0:
+        return None
+    length = 9 - data[pos].bit_length()
+    if pos + length > len(data):
+        return None
+    value = data[pos] if keep_marker else data[pos] & (0xff >> length)
+    for byte in data[pos + 1:pos + length]:
+        value = value << 8 | byte
+    return value, pos + length
+
+
+def _ebml(data: bytes) -> Optional[str]:
+    header = _vint(data, 4)
+    if header is None:
+        return None
+    size, pos = header
+    end = min(len(data), pos + size)
+    while pos < end:
+        element = _vint(data, pos, keep_marker=True)
+        if element is None:
+            return None
+        element_id, pos = element
+        length = _vint(data, pos)
+        if length is None:
+            return None
+        size, pos = length
+        if element_id == 0x4282:
+            return _EBML.get(data[pos:pos + size].rstrip(b"\0"))
+        pos += size
+    return None
+
+
+def _ogg(data: bytes) -> Optional[str]:
+    if len(data) < 27:
+        return None
+    packet = data[27 + data[26]:]
+    return "audio/ogg" if packet.startswith(_OGG) else None
+
+
+_CONTAINERS: Dict[bytes, Callable[[bytes], Optional[str]]] = {
+    b"RIFF": _riff,
+    b"FORM": _iff,
+    b"\x1aE\xdf\xa3": _ebml,
+    b"OggS": _ogg,
+}
+
+
+def sniff_signature(data: bytes) -> Optional[str]:
+    """The mime string of `data`, the leading bytes of a file, if it has one
+    of the known signatures."""
+    container = _CONTAINERS.get(data[:4])
+    if container is not None:
+        return container(data)
+    for offset, magic, mime, min_size in _MAGIC:
+        if data.startswith(magic, offset):
+            # cut short, libmagic may say otherwise
+            return mime if len(data) >= min_size else None
+    return _ftyp(data)
+
+
+class SniffStats:
+    """How many detections were answered by signature, and how many went to
+    libmagic, counted safely from detection threads."""
+
+    def __init__(self):
+        self.signature = 0
+        self.libmagic = 0
+        self._lock = threading.Lock()
+
+    def count(self, signature: bool):
+        with self._lock:
+            if signature:
+                self.signature += 1
+            else:
+                self.libmagic += 1
+
+    def hit_rate(self) -> float:
+        with self._lock:
+            total = self.signature + self.libmagic
+            return self.signature / total if total else 0.0
+
+    def reset(self):
+        with self._lock:
+            self.signature = 0
+            self.libmagic = 0
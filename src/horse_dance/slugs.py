@@ -0,0 +1,56 @@
+"""Slugifying file stems."""
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+import re
+
+# Plain ASCII without quotes, entities or digit-grouping commas slugifies to
+# its lowercase alphanumeric runs joined by dashes; anything else goes through
+# the full `slugify` pipeline.
+_NEEDS_SLUGIFY = re.compile(r"[^\x00-\x7f]|['&,]")
+_DISALLOWED = re.compile(r"[^a-z0-9]+")
+
+
+def slugify(text: str) -> str:
+    """`slugify.slugify`, imported on first use; its transliteration tables
+    are slow to load and most stems never need them."""
+    from slugify import slugify as _slugify  # type: ignore  # pylint: disable=import-outside-toplevel
+    return _slugify(text)
+
+
+def fast_slugify(text: str) -> str:
+    """Same output as `slugify(text)`, skipping transliteration, entity
+    decoding and unicode normalization when the text has no use for them."""
+    if _NEEDS_SLUGIFY.search(text) is not None:
+        return slugify(text)
+    return _DISALLOWED.sub("-", text.lower()).strip("-")
+
+
+ENGINES: Dict[str, Callable[[str], str]] = {
+    "fast": fast_slugify,
+    "slugify": slugify,
+}
+
+
+class Slugger:
+    """A slug engine, by name or callable, with a bounded memo of results."""
+
+    def __init__(self, engine='fast', cache_size: Optional[int] = 1 << 16):
+        self.engine = ENGINES[engine] if isinstance(engine, str) else engine
+        self.cache_size = cache_size
+        self._install_memo()
+
+    def _install_memo(self):
+        self._memo = lru_cache(maxsize=self.cache_size)(self.engine)
+
+    def __getstate__(self):
+        return dict(engine=self.engine, cache_size=self.cache_size)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._install_memo()
+
+    def __call__(self, text: str) -> str:
+        return self._memo(text)
+
+    def cache_info(self):
+        return self._memo.cache_info()
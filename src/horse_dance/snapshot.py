@@ -0,0 +1,80 @@
+"""Configuration compiled once, for processes that start often.
+
+A config has `mime`, `resolver` and `normalizer` sections, as given to
+`MimeType.initialize`, `MimeResolver` and `Normalizer`. Setting these up
+re-reads the system mime.types files and re-parses every section; a snapshot
+holds the results, the extension index and the constructed resolver and
+normalizer, and loads with one read:
+
+    Snapshot.compile(config).save("horse-dance.snapshot")
+    resolver, normalizer = Snapshot.load("horse-dance.snapshot").install()
+
+Snapshots are pickles, so load only ones you compiled yourself.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Tuple, Union
+import pickle
+import struct
+
+from horse_dance.extension_index import ExtensionIndex
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.normalizer import Normalizer
+
+SNAPSHOT_VERSION = 1
+
+_MAGIC = b"HDSNAP"
+_version = struct.Struct("<H")
+
+# settings applied by `MimeType.configure`, rather than built into the index
+_DETECTION_KEYS = ('magic', 'header_size', 'sniff_compressed', 'signatures', 'cache')
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    index: ExtensionIndex
+    detection: dict
+    resolver: MimeResolver
+    normalizer: Normalizer
+
+    @staticmethod
+    def compile(config: dict) -> 'Snapshot':
+        mime_config = config.get('mime', {})
+        if 'index' in mime_config:
+            index = ExtensionIndex.load(mime_config['index'])
+        else:
+            index = MimeType.build_index(mime_config)
+        return Snapshot(
+            index,
+            {key: mime_config[key] for key in _DETECTION_KEYS if key in mime_config},
+            MimeResolver(config.get('resolver')),
+            Normalizer(config.get('normalizer')),
+        )
+
+    def install(self) -> Tuple[MimeResolver, Normalizer]:
+        """Set `MimeType` up as the config would, returning the resolver and
+        normalizer."""
+        MimeType.use_index(self.index)
+        MimeType.configure(self.detection)
+        return self.resolver, self.normalizer
+
+    def save(self, path: Union[str, Path]):
+        with open(path, 'wb') as fh:
+            fh.write(_MAGIC + _version.pack(SNAPSHOT_VERSION))
+            pickle.dump(self, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> 'Snapshot':
+        with open(path, 'rb') as fh:
+            data = fh.read()
+        header = len(_MAGIC) + _version.size
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"{path} is not a snapshot")
+        (version,) = _version.unpack_from(data, len(_MAGIC))
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {version}, recompile it")
+        snapshot = pickle.loads(memoryview(data)[header:])
+        if not isinstance(snapshot, Snapshot):
+            raise ValueError(f"{path} is not a snapshot")
+        return snapshot
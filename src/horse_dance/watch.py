@@ -0,0 +1,212 @@
+"""Resolving and normalizing files as they land in a watched tree (Linux)."""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import queue
+import select
+import struct
+import threading
+import time
+
+from horse_dance.mime_resolver import MimeResolver, Mimes
+from horse_dance.normalizer import FileInfo, FileName, Normalizer
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_ONLYDIR
+
+_event = struct.Struct("iIII")
+
+logger = logging.getLogger(__name__)
+
+
+class Inotify:
+    """A minimal inotify binding through libc."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: Path, mask: int = WATCH_MASK) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def read(self, timeout: Optional[float]) -> Iterator[Tuple[int, int, str]]:
+        """Events, as (watch descriptor, mask, name), available within
+        `timeout` seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _event.unpack_from(data, offset)
+            offset += _event.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            yield wd, mask, name
+
+    def close(self):
+        os.close(self.fd)
+
+
+@dataclass(frozen=True)
+class Landed:
+    path: Path
+    mimes: Mimes
+    info: FileInfo
+
+
+class Watcher:
+    """Watches a tree for files closed after writing or moved in, and passes
+    each through the resolver and normalizer to `handler` once it settles.
+
+    A file settles when it has had no events for `settle` seconds. Settled
+    files go in batches of up to `batch_size` onto a queue of at most
+    `queue_size` batches, drained by `workers` threads; when the queue is
+    full, reading events waits, leaving them to queue in the kernel.
+    Directories created or moved in are watched too, and files already in
+    them are handled as if they had landed.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        handler: Callable[[Landed], None],
+        resolver: Optional[MimeResolver] = None,
+        normalizer: Optional[Normalizer] = None,
+        settle: float = 0.05,
+        batch_size: int = 64,
+        queue_size: int = 64,
+        workers: int = 4,
+    ):
+        self.root = root
+        self.handler = handler
+        self.resolver = MimeResolver() if resolver is None else resolver
+        self.normalizer = Normalizer() if normalizer is None else normalizer
+        self.settle = settle
+        self.batch_size = batch_size
+        self.workers = workers
+        self._work: "queue.Queue[Optional[List[Path]]]" = queue.Queue(queue_size)
+        self._inotify = Inotify()
+        self._dirs: Dict[int, Path] = {}
+        self._pending: Dict[Path, float] = {}
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def __enter__(self) -> 'Watcher':
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._watch_tree(self.root, initial=True)
+        self._threads = [threading.Thread(target=self._read_events, daemon=True)] + [
+            threading.Thread(target=self._work_batches, daemon=True)
+            for _ in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._threads[0].join()
+        for _ in range(self.workers):
+            self._work.put(None)
+        for thread in self._threads[1:]:
+            thread.join()
+        self._inotify.close()
+
+    def _watch_tree(self, top: Path, initial: bool = False):
+        now = time.monotonic()
+        for directory, _, files in os.walk(top):
+            try:
+                wd = self._inotify.add_watch(Path(directory))
+            except OSError as err:
+                logger.warning("cannot watch %s: %s", directory, err)
+                continue
+            self._dirs[wd] = Path(directory)
+            if not initial:
+                for name in files:
+                    self._pending[Path(directory) / name] = now
+
+    def _read_events(self):
+        while not self._stopping.is_set():
+            for wd, mask, name in self._inotify.read(self.settle):
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("inotify queue overflowed; events were lost")
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                directory = self._dirs.get(wd)
+                if directory is None:
+                    continue
+                path = directory / name
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        self._watch_tree(path)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self._pending[path] = time.monotonic()
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._pending.pop(path, None)
+            self._flush_settled()
+
+    def _flush_settled(self):
+        cutoff = time.monotonic() - self.settle
+        settled = [path for path, seen in self._pending.items() if seen <= cutoff]
+        for path in settled:
+            del self._pending[path]
+        for start in range(0, len(settled), self.batch_size):
+            self._work.put(settled[start:start + self.batch_size])
+
+    def _work_batches(self):
+        while True:
+            batch = self._work.get()
+            if batch is None:
+                return
+            for path in batch:
+                try:
+                    self.handler(self.land(path))
+                except FileNotFoundError:
+                    pass
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("failed handling %s", path)
+
+    def land(self, path: Path) -> Landed:
+        mimes = self.resolver.resolve_path(path)
+        if mimes.resolved is None:
+            return Landed(path, mimes, FileInfo(path, FileName.of_path(path)))
+        return Landed(path, mimes, self.normalizer(path, mimes.resolved.mime))
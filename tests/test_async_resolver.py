@@ -0,0 +1,62 @@
+import asyncio
+from pathlib import Path, PurePath
+
+from horse_dance.async_resolver import AsyncMimeResolver
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver, Matched
+
+_mime_file_cases = Path(__file__).parent / "mime_file_cases"
+
+
+def test_resolve_path():
+    resolver = MimeResolver()
+    async_resolver = AsyncMimeResolver(resolver, limit=2)
+
+    async def resolve_all():
+        paths = sorted(_mime_file_cases.iterdir())
+        return paths, await asyncio.gather(*map(async_resolver.resolve_path, paths))
+
+    paths, results = asyncio.run(resolve_all())
+    assert results == [resolver.resolve_path(p) for p in paths]
+
+
+def test_scan():
+    resolver = MimeResolver()
+    async_resolver = AsyncMimeResolver(resolver, limit=3, listing_batch=2)
+
+    async def scan():
+        return [r async for r in async_resolver.scan(_mime_file_cases.parent / "file-examples")]
+
+    assert asyncio.run(scan()) == list(resolver.scan(_mime_file_cases.parent / "file-examples"))
+
+
+def test_scan_cancelled():
+    async_resolver = AsyncMimeResolver(limit=2)
+
+    async def scan_one():
+        async for result in async_resolver.scan(_mime_file_cases.parent / "file-examples"):
+            return result
+
+    assert asyncio.run(scan_one())[0].parent.name == "file-examples"
+
+
+def test_resolve_stream():
+    data = (_mime_file_cases / "sample.jpg").read_bytes()
+    chunks_read = []
+
+    async def upload():
+        for start in range(0, len(data), 1024):
+            chunks_read.append(start)
+            yield data[start:start + 1024]
+
+    async def resolve(head_size):
+        return await AsyncMimeResolver().resolve_stream(upload(), PurePath("photo.jpg"), head_size)
+
+    mimes, head = asyncio.run(resolve(None))
+    assert mimes.resolved == Matched(MimeType.of_str("image/jpeg"))
+    assert head == data[:1024]
+    assert len(chunks_read) == 1
+
+    mimes, head = asyncio.run(resolve(3000))
+    assert head == data[:3072]
+    assert mimes.file == MimeType.of_str("image/jpeg")
@@ -0,0 +1,100 @@
+from array import array
+
+import pytest
+
+from horse_dance import batch
+from horse_dance.batch import resolve_codes
+from horse_dance.mime_resolver import MimeResolver, Matched, NameOnly
+from horse_dance.mime_types import MimeType
+from horse_dance.results import RULES
+
+_config = dict(
+    substitutions=(
+        dict(file="video/abc", name="video/def", resolution="video/xyz"),
+        dict(file="text/plain", name="image/png", resolution="image/png"),
+        dict(file="audio/x-wav", name="audio/wav", resolution="audio/wav"),
+    ),
+    binary_types=("image",),
+    binary_mimes=("video/mp4",),
+    media_correction=("image/target", "video/abc", "application/json"),
+)
+
+_mimes = [MimeType.of_str(m) for m in (
+    "audio/wav", "audio/x-wav", "inode/directory", "inode/x-empty", "text/plain",
+    "text/javascript", "application/octet-stream", "image/png", "image/jpeg",
+    "image/approx", "image/target", "video/abc", "video/def", "video/mp4", "_",
+    "application/pdf", "audio/wav",
+)] + [
+    MimeType("application", "x-tar", "gzip"), MimeType("application", "x-tar"),
+    MimeType("application", "json", "gzip"), MimeType("application", "json", "xz"),
+    MimeType("application", "octet-stream", "gzip"), MimeType(compression="gzip"),
+    MimeType("text", "plain", "gzip"),
+]
+
+
+@pytest.fixture(params=["numpy", "python"])
+def no_numpy(request, monkeypatch):
+    monkeypatch.setattr(MimeType, "ExtensionOptional", frozenset([MimeType.of_str("text/plain")]))
+    if request.param == "python":
+        monkeypatch.setattr(batch, "numpy", None)
+
+
+def _expected(resolver, mimes, file, name):
+    for f, n in zip(file, name):
+        resolved = resolver.resolve(mimes[f], mimes[n]).resolved
+        if resolved is None:
+            yield None, None
+        else:
+            yield resolved.mime, type(resolved)
+
+
+# with every pair twice, there are more rows than pairs in the table
+@pytest.mark.parametrize("copies", [1, 2])
+def test_resolve_codes_matches_resolve(no_numpy, copies):
+    resolver = MimeResolver(_config)
+    pairs = [(f, n) for f in range(len(_mimes)) for n in range(len(_mimes))] * copies
+    file = array('i', (f for f, _ in pairs))
+    name = array('i', (n for _, n in pairs))
+    mimes, resolved, rules = resolve_codes(resolver, _mimes, file, name)
+    assert mimes[:len(_mimes)] == _mimes
+    # the substitution result was not in the table
+    assert MimeType.of_str("video/xyz") in mimes[len(_mimes):]
+    got = [
+        (None, None) if code < 0 else (mimes[code], RULES[rule])
+        for code, rule in zip(resolved, rules)
+    ]
+    assert got == list(_expected(resolver, _mimes, file, name))
+    assert all((code < 0) == (rule < 0) for code, rule in zip(resolved, rules))
+
+
+def test_resolve_codes_empty(no_numpy):
+    mimes, resolved, rules = resolve_codes(MimeResolver(), _mimes, array('i'), array('i'))
+    assert mimes == _mimes
+    assert len(resolved) == len(rules) == 0
+
+
+def test_resolve_codes_checks_codes(no_numpy):
+    with pytest.raises(ValueError):
+        resolve_codes(MimeResolver(), _mimes, [0, len(_mimes)], [0, 0])
+    with pytest.raises(ValueError):
+        resolve_codes(MimeResolver(), _mimes, [-1], [0])
+    with pytest.raises(ValueError):
+        resolve_codes(MimeResolver(), _mimes, [0, 1], [0])
+
+
+def test_resolve_codes_other_rules(no_numpy):
+    resolver = MimeResolver()
+    resolver.resolvers = [NameOnly]
+    mimes, resolved, rules = resolve_codes(resolver, _mimes, [0, 4], [7, 8])
+    assert [mimes[c] for c in resolved] == [_mimes[7], _mimes[8]]
+    assert [RULES[r] for r in rules] == [NameOnly, NameOnly]
+
+
+def test_resolve_codes_numpy_columns():
+    numpy = pytest.importorskip("numpy")
+    file = numpy.array([0, 16, 4], dtype=numpy.int32)
+    name = numpy.array([16, 0, 5], dtype=numpy.int64)
+    _, resolved, rules = resolve_codes(MimeResolver(), _mimes, file, name)
+    # equal mimes at different codes still match, resolving to the first
+    assert list(resolved[:2]) == [0, 0]
+    assert [RULES[r] for r in rules[:2]] == [Matched, Matched]
@@ -0,0 +1,50 @@
+import io
+import random
+from pathlib import PurePath
+
+from horse_dance.bulk import SuffixTable, classify_stream, read_paths
+from horse_dance.mime_types import MimeType
+
+_names = (
+    "", ".", "..", "/", "a", "a.", ".a", "..a", "a..gz", ".tar.gz", "..tar.gz",
+    "x.tar.gz", "x.tgz", "a.b.tgz", ".bashrc", "IMG_0001.JPG", "song.mp3.gz",
+    "archive.tar.bz2", "notes.txt", "a/b/c.png", "a/b/", "a/b/.", "a/./", "a//b.html",
+    "dir.d/file", "weird.GZ", "x.svgz", "name.with.many.dots.json",
+)
+
+
+def _corpus():
+    exts = sorted(MimeType.extension_index().types) + [".gz", ".bz2", ".xz", ".Z", ".tgz"]
+    rand = random.Random(0)
+    for _ in range(3000):
+        prefix = rand.choice(("", ".", "..", "stem", "a/b/", "a/.hidden"))
+        yield prefix + "".join(rand.choice(exts) for _ in range(rand.randint(0, 3)))
+
+
+def test_classify_matches_of_name():
+    table = SuffixTable()
+    paths = list(_names) + list(_corpus())
+    for path, mime in zip(paths, table.classify(paths)):
+        assert mime is MimeType.of_name(PurePath(path)), path
+    assert len(table.mimes) < len(paths)
+
+
+def test_read_paths_chunks():
+    paths = ["a.txt", "b/ü.png", "c d.json"] * 50
+    data = b"\0".join(p.encode() for p in paths)
+    chunks = list(read_paths(io.BytesIO(data), b"\0", chunk_size=7))
+    assert [p for chunk in chunks for p in chunk] == paths
+    assert len(chunks) > 1
+
+
+def test_classify_stream():
+    source = io.BytesIO(b"a.txt\nb.png\nc\n")
+    sink = io.BytesIO()
+    assert classify_stream(source, sink) == 3
+    assert sink.getvalue().decode().splitlines() == [
+        f"{MimeType.of_name(PurePath(p))}\t{p}" for p in ("a.txt", "b.png", "c")
+    ]
+
+    sink = io.BytesIO()
+    classify_stream(io.BytesIO(b"a.txt\0b.png"), sink, sep=b"\0", output="mime")
+    assert sink.getvalue() == b"text/plain\0image/png\0"
@@ -0,0 +1,78 @@
+import io
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from horse_dance.cli import main
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.scanner import walk
+
+_mime_file_cases = Path(__file__).parent / "mime_file_cases"
+
+
+@pytest.fixture
+def tree(tmp_path):
+    previous = MimeType.extension_index()
+    root = tmp_path / "tree"
+    (root / "Some Dir").mkdir(parents=True)
+    shutil.copy(_mime_file_cases / "sample.jpg", root / "Holiday Photo.jpeg")
+    shutil.copy(_mime_file_cases / "sample.mp3", root / "Some Dir" / "Track 01.mp3")
+    shutil.copy(_mime_file_cases / "sample.pdf", root / "Some Dir" / "report.pdf")
+    yield root
+    MimeType.use_index(previous)
+    MimeType.configure({})
+
+
+def _run(*argv):
+    out, err = io.StringIO(), io.StringIO()
+    assert main(list(argv), out, err) == 0
+    return [json.loads(line) for line in out.getvalue().splitlines()], err.getvalue()
+
+
+def test_scan(tree):
+    records, _ = _run("scan", str(tree), "--detect-workers", "3")
+    assert [r["path"] for r in records] == [str(p) for p, _ in walk(tree)]
+    resolver = MimeResolver()
+    for record in records:
+        mimes = resolver.resolve_path(Path(record["path"]))
+        assert record["file"] == str(mimes.file)
+        assert record["rule"] == type(mimes.resolved).__name__
+
+
+def test_normalize_name_only(tree):
+    records, _ = _run("normalize", str(tree), "--name-only")
+    assert {r["rule"] for r in records} == {"NameOnly"}
+    assert records[0]["normalized"] == "holiday-photo.jpeg"
+
+
+def test_plan_and_stats(tree, tmp_path):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps(dict(mime=dict(preferred_ext=[dict(mime="image/jpeg", ext="jpg")]))))
+    records, err = _run("plan", str(tree), "--config", str(config), "--stats")
+    assert records == [
+        dict(directory=str(tree), source="Holiday Photo.jpeg", target="holiday-photo.jpg"),
+        dict(directory=str(tree / "Some Dir"), source="Track 01.mp3", target="track-01.mp3"),
+    ]
+    assert [line.split()[0] for line in err.splitlines()] == [
+        "stage", "walk", "detect", "resolve", "normalize"
+    ]
+
+
+def test_errors_reported(tree):
+    (tree / "dangling").symlink_to(tree / "missing")
+    records, err = _run("scan", str(tree))
+    assert err == f"horse-dance: {tree / 'dangling'}: No such file or directory\n"
+    assert len(records) == 4
+
+
+def test_failure_raised(tree, monkeypatch):
+    def fail(path):
+        raise ValueError(f"cannot detect {path}")
+
+    monkeypatch.setattr(MimeType, "of_contents", fail)
+    for command in ("scan", "normalize", "plan"):
+        with pytest.raises(ValueError, match="cannot detect"):
+            main([command, str(tree)], io.StringIO(), io.StringIO())
@@ -0,0 +1,101 @@
+import gzip
+import json
+from pathlib import Path, PurePath
+
+import pytest
+
+from horse_dance.mime_types import MimeType, decompress_head
+from horse_dance.mime_resolver import MimeResolver, CorrectFormat, Extensionless, Matched
+from horse_dance.normalizer import Normalizer
+
+_compressed_cases = Path(__file__).parent / "file-examples" / "compressed-cases"
+
+
+@pytest.fixture
+def sniffing():
+    MimeType.sniff_compressed = True
+    yield
+    MimeType.sniff_compressed = False
+
+
+def test_name_for_compressed():
+    path = _compressed_cases / "text-file.txt.bz2"
+    assert MimeType.of_file(path) == MimeType.of_str("text/plain", "bzip2")
+    assert MimeType.of_file(path, use_name_for_compressed=False) == MimeType.Compressed["bz2"]
+
+
+def test_sniff_compressed(sniffing, tmp_path):
+    for ext, encoding in (("gz", "gzip"), ("bz2", "bzip2"), ("xz", "xz")):
+        path = _compressed_cases / f"text-file.txt.{ext}"
+        assert MimeType.of_file(path) == MimeType.of_str("text/plain", encoding)
+        assert MimeType.of_buffer(path.read_bytes()) == MimeType.of_str("text/plain", encoding)
+        assert MimeType.of_name(path) == MimeType.of_file(path)
+
+    misnamed = tmp_path / "data.bin"
+    misnamed.write_bytes(gzip.compress(json.dumps({"a": list(range(10000))}).encode()))
+    assert MimeType.of_file(misnamed) == MimeType.of_str("application/json", "gzip")
+
+    corrupt = tmp_path / "corrupt.txt.gz"
+    corrupt.write_bytes(misnamed.read_bytes()[:20] + b"\0" * 20)
+    assert MimeType.of_file(corrupt) == MimeType.of_str("text/plain", "gzip")
+
+
+def test_decompress_head():
+    data = gzip.compress(b"x" * 1000000)
+    assert decompress_head(data[:100], "gzip", 10) == b"x" * 10
+
+
+def test_resolve_and_normalize_compressed(sniffing, tmp_path):
+    path = tmp_path / "My Data.bin.gz"
+    path.write_bytes(gzip.compress(json.dumps({"a": 1}).encode()))
+    resolver = MimeResolver(dict(media_correction=("application/json",)))
+    mimes = resolver.resolve_path(path)
+    assert mimes.file == MimeType.of_str("application/json", "gzip")
+    assert mimes.resolved == CorrectFormat(MimeType.of_str("application/json", "gzip"))
+
+    normalizer = Normalizer()
+    info = normalizer(path, mimes.resolved.mime)
+    assert str(info.normalized_name) == "my-data.json.gz"
+    assert info.raw_stem == "my-data"
+
+    # compressed contents under an uncompressed name
+    misnamed = tmp_path / "data.bin"
+    misnamed.write_bytes(path.read_bytes())
+    mimes = resolver.resolve_path(misnamed)
+    assert mimes.resolved == CorrectFormat(MimeType.of_str("application/json", "gzip"))
+    assert str(normalizer(misnamed, mimes.resolved.mime).normalized_name) == "data.json.gz"
+
+
+    for name, mime, normalized in (
+        ("server.txt.xz", "text/plain!xz", "server.txt.xz"),
+        ("records.xz", "application/json!xz", "records.json.xz"),
+        ("archive.tgz", "application/x-tar!gzip", "archive.tar.gz"),
+        ("README.txt.bz2", "text/plain!bzip2", "readme.txt.bz2"),
+    ):
+        mime_str, compression = mime.split("!")
+        info = normalizer(PurePath(name), MimeType.of_str(mime_str, compression))
+        assert str(info.normalized_name) == normalized
+
+
+def test_resolve_compression_only_name(sniffing, tmp_path, monkeypatch):
+    # a name of only the compression extension is extensionless
+    path = tmp_path / "data.gz"
+    path.write_bytes(gzip.compress(json.dumps({"a": 1}).encode()))
+    resolver = MimeResolver()
+    assert resolver.resolve_path(path).resolved is None
+    monkeypatch.setattr(
+        MimeType, "ExtensionOptional", frozenset([MimeType.of_str("application/json")])
+    )
+    mimes = resolver.resolve_path(path)
+    assert mimes.resolved == Extensionless(MimeType.of_str("application/json", "gzip"))
+    assert str(Normalizer()(path, mimes.resolved.mime).normalized_name) == "data.gz"
+
+    # a different compression in the name is left unresolved
+    assert resolver.resolve(
+        MimeType.of_str("application/json", "gzip"), MimeType.of_str("application/json", "xz")
+    ).resolved is None
+
+
+def test_normalize_unknown_compression():
+    with pytest.raises(ValueError, match="lz4"):
+        Normalizer()(PurePath("data.lz4"), MimeType.of_str("application/json", "lz4"))
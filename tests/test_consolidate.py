@@ -0,0 +1,62 @@
+import shutil
+from pathlib import Path
+
+from horse_dance.consolidate import Consolidator, edge_digest, find_duplicates, full_digest
+from horse_dance.mime_resolver import MimeResolver
+
+_consolidate_test = Path(__file__).parent / "consolidate_test"
+
+
+def _tree(tmp_path) -> Path:
+    tree = tmp_path / "tree"
+    shutil.copytree(_consolidate_test / "tree", tree)
+    return tree
+
+
+def _relative(tree, groups):
+    return [[str(p.relative_to(tree)) for p in g] for g in groups]
+
+
+def test_find_duplicates(tmp_path):
+    tree = _tree(tmp_path)
+    (tree / "empty-1").touch()
+    (tree / "empty-2").touch()
+    groups = find_duplicates(p for p in tree.rglob("*") if p.is_file())
+    assert _relative(tree, groups) == [
+        ["a/b/correct.avi", "correct.avi"],
+        ["a/b/correct.flv", "a/correct.flv", "b/c/correct.flv", "correct.flv"],
+        ["a/b/wrong-ext.webm", "b/c/wrong-ext.webm", "b/wrong-ext.webm"],
+        ["a/f/correct.avi", "b/e/correct.avi"],
+    ]
+
+
+def test_staged_digests(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.write_bytes(b"x" * 10000 + b"a" + b"x" * 10000)
+    b.write_bytes(b"x" * 10000 + b"b" + b"x" * 10000)
+    assert edge_digest(a, 20001) == edge_digest(b, 20001)
+    assert full_digest(a) != full_digest(b)
+    assert find_duplicates([a, b]) == []
+
+
+def test_consolidate(tmp_path):
+    tree = _tree(tmp_path)
+    target = tree / "target"
+    resolver = MimeResolver(dict(media_correction=("video/mp4",)))
+    consolidate = Consolidator(resolver, target, duplicates="symlink")
+
+    plan = consolidate(tree, dry_run=True)
+    assert [c.target.name for c in plan] == [
+        "correct.avi", "correct.flv", "wrong-ext.mp4", "correct-1.avi"
+    ]
+    assert not target.exists()
+
+    plan = consolidate(tree)
+    assert sorted(p.name for p in target.iterdir()) == [
+        "correct-1.avi", "correct.avi", "correct.flv", "wrong-ext.mp4"
+    ]
+    for c in plan:
+        assert not c.canonical.exists()
+        for duplicate in c.duplicates:
+            assert duplicate.resolve() == c.target.resolve()
+    assert consolidate(tree) == []
@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+
+from horse_dance.detection_cache import DetectionCache
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+
+_mime_file_cases = Path(__file__).parent / "mime_file_cases"
+
+
+def test_cache_roundtrip(tmp_path):
+    target = tmp_path / "file"
+    target.write_text("text")
+    st = os.stat(target)
+
+    with DetectionCache(tmp_path / "cache.db") as cache:
+        assert cache.get(st) is None
+        cache.put(st, "text/plain")
+        assert cache.get(st) == "text/plain"
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    with DetectionCache(tmp_path / "cache.db") as cache:
+        assert cache.generation == 2
+        assert cache.get(st) == "text/plain"
+        target.write_text("changed text")
+        assert cache.get(os.stat(target)) is None
+
+
+def test_cache_compact(tmp_path):
+    files = [tmp_path / f"f{i}" for i in range(5)]
+    for f in files:
+        f.write_text(f.name)
+
+    with DetectionCache(tmp_path / "cache.db", flush_every=2) as cache:
+        for f in files:
+            cache.put(os.stat(f), "text/plain")
+
+    with DetectionCache(tmp_path / "cache.db", max_entries=2) as cache:
+        assert cache.get(os.stat(files[0])) == "text/plain"
+        assert cache.get(os.stat(files[1])) == "text/plain"
+
+    with DetectionCache(tmp_path / "cache.db") as cache:
+        assert len(cache) == 2
+        assert cache.get(os.stat(files[0])) == "text/plain"
+        assert cache.get(os.stat(files[4])) is None
+
+
+def test_cache_settings(tmp_path):
+    target = tmp_path / "file"
+    target.write_text("text")
+    st = os.stat(target)
+
+    with DetectionCache(tmp_path / "cache.db") as cache:
+        cache.use_settings((None, True))
+        cache.put(st, "text/plain")
+
+    with DetectionCache(tmp_path / "cache.db") as cache:
+        cache.use_settings((None, True))
+        assert cache.get(st) == "text/plain"
+        cache.use_settings((512, True))
+        assert cache.get(st) is None
+        cache.put(st, "application/octet-stream")
+
+    with DetectionCache(tmp_path / "cache.db") as cache:
+        cache.use_settings((None, True))
+        assert len(cache) == 0
+
+
+def test_cache_across_threads(tmp_path):
+    files = [tmp_path / f"f{i}" for i in range(64)]
+    for f in files:
+        f.write_text(f.name)
+
+    with DetectionCache(tmp_path / "cache.db", flush_every=8) as cache:
+        def detect(f):
+            st = os.stat(f)
+            if cache.get(st) is None:
+                cache.put(st, f.name)
+            return cache.get(st)
+
+        with ThreadPoolExecutor(4) as pool:
+            for _ in range(2):
+                assert list(pool.map(detect, files)) == [f.name for f in files]
+        assert len(cache) == len(files)
+        assert (cache.hits, cache.misses) == (3 * len(files), len(files))
+
+
+def test_cached_detection(tmp_path):
+    MimeType.use_cache(DetectionCache(tmp_path / "cache.db"))
+    try:
+        resolver = MimeResolver()
+        first = dict(resolver.scan(_mime_file_cases))
+        assert MimeType.cache.hits == 0
+        second = dict(resolver.scan(_mime_file_cases))
+        assert second == first
+        assert MimeType.cache.hits == MimeType.cache.misses
+        assert MimeType.of_file(_mime_file_cases / "sample.jpg") == MimeType.of_str("image/jpeg")
+    finally:
+        MimeType.use_cache(None)
+
+
+def test_cached_detection_symlink(tmp_path):
+    target = tmp_path / "t.txt"
+    target.write_text("some text\n")
+    link = tmp_path / "tlink.txt"
+    link.symlink_to(target)
+    MimeType.use_cache(DetectionCache(tmp_path / "cache.db"))
+    try:
+        for _ in range(2):
+            assert MimeType.of_file(link) == MimeType.Symlink
+            assert MimeType.of_file(target) == MimeType.PlainText
+        assert MimeType.cache.hits == 2
+    finally:
+        MimeType.use_cache(None)
+
+
+def test_cached_detection_settings(tmp_path):
+    target = tmp_path / "t.txt"
+    target.write_text("some text\n")
+    MimeType.use_cache(DetectionCache(tmp_path / "cache.db"))
+    try:
+        assert MimeType.of_file(target) == MimeType.PlainText
+        MimeType.cache.put(os.lstat(target), "image/png")
+        assert MimeType.of_file(target) == MimeType.of_str("image/png")
+        MimeType.header_size = 512
+        # detected anew under the new settings
+        assert MimeType.of_file(target) == MimeType.PlainText
+    finally:
+        MimeType.header_size = None
+        MimeType.use_cache(None)
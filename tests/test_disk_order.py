@@ -0,0 +1,61 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from horse_dance.disk_order import detect_in_disk_order, disk_order, physical_offset
+from horse_dance.mime_types import MimeType, read_header, DEFAULT_HEADER_SIZE
+from horse_dance.scanner import walk
+
+_file_examples = Path(__file__).parent / "file-examples"
+
+
+@pytest.mark.parametrize("use_fiemap", [True, False])
+def test_disk_order(use_fiemap):
+    paths = [path for path, _ in walk(_file_examples)]
+    files, others = disk_order(paths, use_fiemap)
+    assert sorted(files + list(others)) == sorted(paths)
+    assert all(p.is_dir() and m is MimeType.Dir for p, m in others.items())
+    if not use_fiemap:
+        inodes = [os.stat(p).st_ino for p in files]
+        assert inodes == sorted(inodes)
+
+
+def test_physical_offset(tmp_path):
+    path = tmp_path / "file"
+    path.write_bytes(b"x" * 4096)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        offset = physical_offset(fd)
+    finally:
+        os.close(fd)
+    assert offset is None or offset >= 0
+
+
+def test_detect_in_disk_order(tmp_path):
+    paths = [path for path, _ in walk(_file_examples)]
+    mimes = detect_in_disk_order(paths, window=4)
+    assert set(mimes) == set(paths)
+    for path in paths:
+        if path.is_dir():
+            assert mimes[path] is MimeType.Dir
+        else:
+            expected = MimeType.of_buffer(read_header(path, DEFAULT_HEADER_SIZE), path)
+            assert mimes[path] is expected, path
+
+    errors = []
+    missing = tmp_path / "missing"
+    assert detect_in_disk_order([missing], onerror=errors.append) == {}
+    assert len(errors) == 1
+    with pytest.raises(FileNotFoundError):
+        detect_in_disk_order([missing])
+
+
+def test_detect_in_disk_order_special_files(tmp_path):
+    fifo = tmp_path / "fifo"
+    os.mkfifo(fifo)
+    link = tmp_path / "link.jpg"
+    link.symlink_to(_file_examples / "sample-media" / "image" / "sample.jpg")
+    assert detect_in_disk_order([fifo, tmp_path, link]) == {
+        fifo: MimeType.of_str("inode/fifo"), tmp_path: MimeType.Dir, link: MimeType.Symlink
+    }
@@ -0,0 +1,52 @@
+import mimetypes
+from pathlib import Path, PurePath
+
+from horse_dance.extension_index import ExtensionIndex
+from horse_dance.mime_types import MimeType
+
+_file_examples = Path(__file__).parent / "file-examples"
+
+_config = dict(
+    extras=(dict(mime="text/custom", ext="custom"),),
+    preferred_ext=(dict(mime="image/jpeg", ext="jpeg"),),
+    ext_optional=("text/plain",),
+)
+
+
+def test_guess_matches_mimetypes():
+    index = MimeType.build_index(_config)
+    names = [p.name for p in _file_examples.rglob("*")] + [
+        "archive.tar.gz", "archive.tgz", "archive.TGZ", "photo.JPG", "a.b.c.txt",
+        "data.json.xz", "data.json.bz2", "file.custom", "file.unknownext", ".hidden",
+    ]
+    names += ["x" + ext for ext in index.types]
+    for name in names:
+        assert index.guess(name) == mimetypes.guess_type(name, strict=False), name
+
+
+def test_extensions_match_mimetypes():
+    index = MimeType.build_index(_config)
+    for mime in set(index.types.values()):
+        exts = mimetypes.guess_all_extensions(mime, strict=False)
+        assert index.extensions_of(mime) == tuple(ext[1:] for ext in exts)
+    assert index.extensions_of("text/custom") == ("custom",)
+    assert index.extension_set("text/custom") is index.extension_set("text/custom")
+    assert index.extensions_of("no/such") == ()
+
+
+def test_dump_load(tmp_path):
+    index = MimeType.build_index(_config)
+    index.dump(tmp_path / "index.json")
+    loaded = ExtensionIndex.load(tmp_path / "index.json")
+    assert loaded == index
+    assert loaded.preferred_ext == {"image/jpeg": "jpeg"}
+
+    previous = MimeType.extension_index()
+    MimeType.initialize(dict(index=str(tmp_path / "index.json")))
+    try:
+        assert MimeType.index == index
+        assert MimeType.of_name(PurePath("file.custom")) == MimeType.of_str("text/custom")
+        assert MimeType.of_str("image/jpeg").correct_extension("jpg") == "jpeg"
+        assert MimeType.PlainText.correct_extension("") == ""
+    finally:
+        MimeType.use_index(previous)
@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+
+from horse_dance import instrument
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.normalizer import Normalizer
+
+_sample_media = Path(__file__).parent / "file-examples" / "sample-media"
+
+
+def test_instrumented_stages_and_rules():
+    resolver, normalizer = MimeResolver(), Normalizer()
+    original = MimeType.__dict__["of_file"]
+    seen, resolved = [], 0
+    paths = sorted(p for p in _sample_media.rglob("*") if p.is_file())
+    with instrument.instrumented(instrument.Metrics(hooks=[lambda s, t: seen.append(s)])) as metrics:
+        assert instrument.active() is metrics
+        for path in paths:
+            mimes = resolver.resolve_path(path)
+            if mimes.resolved is not None:
+                resolved += 1
+                normalizer(path, mimes.resolved.mime)
+    assert MimeType.__dict__["of_file"] is original
+    assert instrument.active() is None
+
+    snapshot = metrics.snapshot()
+    stages = snapshot["stages"]
+    assert stages["mime.of_file"]["count"] == len(paths)
+    assert stages["mime.of_name"]["count"] == len(paths)
+    assert stages["normalizer.normalize"]["count"] == resolved
+    assert sum(snapshot["counters"].values()) == resolved
+    assert stages["resolver.resolve"]["count"] == len(paths)
+    assert len(seen) == sum(s["count"] for s in stages.values())
+    assert json.loads(metrics.to_json()) == snapshot
+
+    text = metrics.to_prometheus()
+    assert 'horse_dance_stage_seconds_count{stage="mime.of_file"} %d' % len(paths) in text
+    assert 'horse_dance_events_total{event="rule.Matched"}' in text
+
+
+def test_memoized_rule_counts():
+    resolver = MimeResolver(dict(cache_size=None))
+    with instrument.instrumented() as metrics:
+        results = list(resolver.scan(_sample_media, workers=1))
+        results += list(resolver.scan(_sample_media, workers=1))
+    resolved = sum(mimes.resolved is not None for _, mimes in results)
+    snapshot = metrics.snapshot()
+    assert resolver.cache_info().hits > 0
+    assert sum(snapshot["counters"].values()) == resolved
+    files = sum(mimes.file is not MimeType.Dir for _, mimes in results)
+    assert snapshot["stages"]["mime.of_contents"]["count"] == files
+
+
+def test_disabled_records_nothing():
+    metrics = instrument.enable()
+    instrument.disable()
+    MimeResolver().resolve_path(Path(__file__))
+    assert metrics.snapshot() == dict(stages={}, counters={})
@@ -0,0 +1,32 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import magic  # type: ignore
+
+from horse_dance.magic_pool import MagicPool, no_check_flags
+
+_sample_media = Path(__file__).parent / "file-examples" / "sample-media"
+
+
+def test_no_check_flags():
+    assert no_check_flags(()) == 0
+    assert no_check_flags(("tar", "elf")) == magic.MAGIC_NO_CHECK_TAR | magic.MAGIC_NO_CHECK_ELF
+    pool = MagicPool(no_check=("tar",))
+    assert pool.handle().flags & magic.MAGIC_NO_CHECK_TAR
+
+
+def test_handle_per_thread():
+    pool = MagicPool()
+    with ThreadPoolExecutor(4) as executor:
+        handles = set(executor.map(lambda _: id(pool.handle()), range(16)))
+    assert 1 <= len(handles) <= 4
+    assert pool.handle() is pool.handle()
+
+
+def test_detection_matches():
+    pool = MagicPool(no_check=("tar", "elf"))
+    paths = sorted(p for p in _sample_media.rglob("*") if p.is_file())
+    with ThreadPoolExecutor(4) as executor:
+        detected = list(executor.map(pool.from_file, paths))
+    assert detected == [magic.from_file(str(p), mime=True) for p in paths]
+    assert pool.from_buffer(paths[0].read_bytes()) == detected[0]
@@ -0,0 +1,91 @@
+import os
+import shutil
+from pathlib import Path
+
+from horse_dance.manifest import Manifest, ManifestScanner
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.mime_types import MimeType
+
+_sample_media = Path(__file__).parent / "file-examples" / "sample-media"
+
+
+class CountingScanner(ManifestScanner):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.recorded = []
+
+    def record(self, path, st):
+        self.recorded.append(path.name)
+        return super().record(path, st)
+
+
+def _changes(changes):
+    return sorted((c.kind, c.path) for c in changes)
+
+
+def test_manifest_roundtrip(tmp_path):
+    manifest, changes = ManifestScanner().scan(_sample_media)
+    assert len(changes) == len(manifest.files) == len([p for p in _sample_media.rglob("*") if p.is_file()])
+    assert manifest.files["image/sample.jpg"].mimes.resolved.mime == MimeType.of_str("image/jpeg")
+    assert str(manifest.files["image/sample.jpg"].normalized_name) == "sample.jpg"
+
+    manifest.save(tmp_path / "manifest.gz")
+    loaded = Manifest.load(tmp_path / "manifest.gz")
+    assert loaded == manifest
+    assert ManifestScanner().scan(_sample_media, loaded)[1] == []
+
+
+def test_incremental_scan(tmp_path):
+    root = tmp_path / "tree"
+    shutil.copytree(_sample_media, root)
+    scanner = CountingScanner()
+    manifest, _ = scanner.scan(root)
+
+    scanner.recorded.clear()
+    assert scanner.scan(root, manifest)[1] == []
+    assert scanner.recorded == []
+
+    shutil.copy(root / "image" / "sample.png", root / "image" / "new.png")
+    (root / "text" / "sample.txt").write_text("rewritten in place\n")
+    os.utime(root / "text" / "sample.txt", ns=(1, 1))
+    os.unlink(root / "audio" / "sample.wav")
+    (root / "video" / "more").mkdir()
+    shutil.copy(root / "video" / "sample.webm", root / "video" / "more" / "clip.webm")
+
+    updated, changes = scanner.scan(root, manifest)
+    assert _changes(changes) == [
+        ("added", "image/new.png"),
+        ("added", "video/more/clip.webm"),
+        ("modified", "text/sample.txt"),
+        ("removed", "audio/sample.wav"),
+    ]
+    assert sorted(scanner.recorded) == ["clip.webm", "new.png", "sample.txt"]
+    assert updated.dirs["video"].subdirs == ["more"]
+    assert scanner.scan(root, updated)[1] == []
+
+
+def test_trusting_unchanged_dirs(tmp_path):
+    root = tmp_path / "tree"
+    shutil.copytree(_sample_media / "text", root)
+    scanner = ManifestScanner(check_files=False)
+    manifest, _ = scanner.scan(root)
+    dir_mtime = os.stat(root).st_mtime_ns
+    (root / "sample.txt").write_text("rewritten in place\n")
+    os.utime(root, ns=(dir_mtime, dir_mtime))
+    assert scanner.scan(root, manifest)[1] == []
+    assert _changes(ManifestScanner().scan(root, manifest)[1]) == [("modified", "sample.txt")]
+
+
+def test_directory_removed_while_scanning(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.txt").write_text("b")
+    (tmp_path / "a.txt").write_text("a")
+
+    class RemovingScanner(ManifestScanner):
+        def record(self, path, st):
+            shutil.rmtree(tmp_path / "sub", ignore_errors=True)
+            return super().record(path, st)
+
+    manifest, changes = RemovingScanner().scan(tmp_path)
+    assert _changes(changes) == [("added", "a.txt")]
+    assert "sub" not in manifest.dirs
@@ -1,3 +1,4 @@
+import pickle
 from pathlib import PurePath, Path
 
 from horse_dance.mime_types import MimeType
@@ -65,3 +66,53 @@ def test_resolve_path():
         rp(_mime_file_cases / "sample.mp3").resolved
         == Matched(MimeType.of_str("audio/mpeg"))
     )
+
+
+def test_scan():
+    mime_resolver = MimeResolver(_config)
+    scanned = list(mime_resolver.scan(_mime_file_cases, workers=4, window=2))
+    assert [p.name for p, _ in scanned] == sorted(p.name for p in _mime_file_cases.iterdir())
+    for path, mimes in scanned:
+        assert mimes == mime_resolver.resolve_path(path)
+
+
+def test_scan_tree():
+    mime_resolver = MimeResolver(_config)
+    root = _mime_file_cases.parent / "file-examples"
+    scanned = dict(mime_resolver.scan(root))
+    assert set(scanned) == set(root.rglob("*"))
+    assert scanned[root / "sample-media"].resolved == Inode(MimeType.Dir)
+
+
+def test_scan_errors(tmp_path):
+    (tmp_path / "broken").symlink_to(tmp_path / "missing")
+    (tmp_path / "sample.txt").write_text("some text\n")
+    errors = []
+    scanned = dict(MimeResolver(_config).scan(tmp_path, onerror=errors.append))
+    assert list(scanned) == [tmp_path / "sample.txt"]
+    assert len(errors) == 1
+
+
+def test_memoized_resolve():
+    mime_resolver = MimeResolver(_config)
+    memoized = MimeResolver(dict(_config, cache_size=4))
+    pairs = [
+        (MimeType.of_str(f), MimeType.of_str(n))
+        for f in ("audio/wav", "image/target", "video/abc", "text/plain")
+        for n in ("audio/wav", "image/approx", "video/def", "text/javascript")
+    ]
+    for file_mime, name_mime in pairs * 2:
+        assert memoized.resolve(file_mime, name_mime) == mime_resolver.resolve(file_mime, name_mime)
+
+    info = memoized.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (0, 32, 4)
+    assert memoized.resolve(*pairs[-1]) is memoized.resolve(*pairs[-1])
+    assert memoized.cache_info().hits == 2
+    assert mime_resolver.cache_info() is None
+
+    wav = MimeType.of_str("audio/wav")
+    assert mime_resolver.resolve(wav, wav).resolved is memoized.resolve(wav, wav).resolved
+
+    restored = pickle.loads(pickle.dumps(memoized))
+    assert restored.resolve(wav, wav) == memoized.resolve(wav, wav)
+    assert restored.cache_info().currsize == 1
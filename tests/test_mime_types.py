@@ -1,4 +1,8 @@
 from pathlib import PurePath, Path
+import bz2
+import pickle
+
+import magic  # type: ignore
 
 from src.horse_dance.mime_types import MimeType as MT
 
@@ -79,3 +83,35 @@ def test_file_detection():
     assert MT.of_file(_mime_file_cases / "text") == MT.PlainText
     assert MT.of_file(_mime_file_cases / "runme") == MT.of_str("text/x-shellscript")
     assert MT.of_file(_mime_file_cases) == MT.Dir
+
+
+def test_buffer_detection():
+    MT.initialize(_config)
+    data = (_mime_file_cases / "sample.jpg").read_bytes()
+    assert MT.of_buffer(data[:4096]) == MT.of_str("image/jpeg")
+    assert MT.of_buffer(b"") == MT.Empty
+    assert MT.of_buffer(b"plain words\n") == MT.PlainText
+    assert MT.of_buffer(bz2.compress(b"words"), PurePath("f.txt.bz2")) == MT.of_str("text/plain", "bzip2")
+    assert MT.of_buffer(bz2.compress(b"words")) == MT.Compressed["bz2"]
+
+
+def test_header_detection():
+    MT.initialize(dict(_config, header_size=4096))
+    try:
+        assert MT.header_size == 4096
+        for name in ("sample.jpg", "sample.mp3", "sample.pdf", "empty", "runme", "text"):
+            path = _mime_file_cases / name
+            assert MT.of_file(path) == MT.of_str(magic.from_file(str(path), mime=True))
+    finally:
+        MT.initialize(_config)
+    assert MT.header_size is None
+
+
+def test_interning():
+    assert MT("audio", "wav") is MT.of_str("audio/wav")
+    assert MT.of_str("audio/wav", "xz") is MT("audio", "wav", "xz")
+    assert MT.of_str("") is MT.Unknown
+    assert pickle.loads(pickle.dumps(MT.PlainText)) is MT.PlainText
+    assert not hasattr(MT.PlainText, "__dict__")
+    assert str(MT("audio", "wav", "xz")) == "audio/wav!xz"
+    assert repr(MT.PlainText) == "MimeType(type='text', format='plain', compression=None)"
@@ -80,3 +80,24 @@ def test_normalize_with_mime():
     test_n("my-text-file.other", "text/plain", "my-text-file.txt")
     test_n("my-unknown.other", "text/unknown", None)
     test_n("my-unknown.other", None, "my-unknown.other")
+
+
+def test_normalize_many():
+    MimeType.initialize(config.get('mime_types'))
+    normalizer = Normalizer(config.get('normalizer'))
+    paths = [PurePath(p) for p in (
+        "/root/of/part/path/IMG_0001.jpg",
+        "/root/of/part/path/image.jpg",
+        "/root/of/part/path/This is.file.jpg",
+        "/root/of/other/file-1.txt",
+        "elsewhere/05.txt",
+        "/root/of/image-02.txt",
+    )]
+    mimes = [MimeType.of_name(p) for p in paths]
+    assert list(normalizer.normalize_many(paths, mimes)) == [
+        normalizer(p, m) for p, m in zip(paths, mimes)
+    ]
+    assert list(normalizer.normalize_many(paths)) == [normalizer(p) for p in paths]
+    assert [str(i.normalized_name) for i in normalizer.normalize_many(paths[:2], mimes)] == [
+        "img-0001.jpeg", "image--part-path.jpeg"
+    ]
@@ -0,0 +1,133 @@
+from pathlib import PurePath
+import os
+
+import pytest
+
+from horse_dance import renamer
+from horse_dance.normalizer import Normalizer
+from horse_dance.renamer import Rename, RenameJournal, plan_renames
+
+
+@pytest.fixture(params=["renameat2", "link"])
+def rename_via(request, monkeypatch):
+    if request.param == "renameat2" and renamer._renameat2 is None:
+        pytest.skip("renameat2 is not available")
+    if request.param == "link":
+        monkeypatch.setattr(renamer, "_renameat2", None)
+
+
+def _make_tree(root, names):
+    for name in names:
+        (root / name).write_text(name)
+
+
+def test_plan_renames(tmp_path):
+    _make_tree(tmp_path, ("My Photo.JPG", "my photo.jpg", "my-photo.jpg", "kept.txt", "My_Photo.jpg"))
+    normalizer = Normalizer()
+    infos = normalizer.normalize_many(sorted(tmp_path.iterdir()))
+    assert list(plan_renames(infos)) == [
+        Rename(tmp_path, "My Photo.JPG", "my-photo.JPG"),
+        Rename(tmp_path, "My_Photo.jpg", "my-photo-1.jpg"),
+        Rename(tmp_path, "my photo.jpg", "my-photo-2.jpg"),
+    ]
+
+
+def test_plan_renames_without_disk():
+    normalizer = Normalizer()
+    paths = [PurePath("a/Big File.txt"), PurePath("a/big file.txt"), PurePath("b/Big File.txt")]
+    plan = list(plan_renames(map(normalizer, paths), existing=lambda d: ()))
+    assert [(str(r.directory), r.target) for r in plan] == [
+        ("a", "big-file.txt"), ("a", "big-file-1.txt"), ("b", "big-file.txt")
+    ]
+
+
+def test_plan_renames_around_normalized_names():
+    normalizer = Normalizer()
+    paths = [PurePath("a/big-file.txt"), PurePath("a/Big File.txt"), PurePath("a/Other File.txt")]
+    plan = list(plan_renames(map(normalizer, paths), existing=lambda d: ()))
+    assert [(r.source, r.target) for r in plan] == [
+        ("Big File.txt", "big-file-1.txt"), ("Other File.txt", "other-file.txt")
+    ]
+
+
+def test_journal_apply_resume_rollback(tmp_path):
+    names = [f"File {i}.txt" for i in range(5)]
+    _make_tree(tmp_path, names)
+    plan = [Rename(tmp_path, name, name.replace(" ", "-").lower()) for name in names]
+
+    journal = RenameJournal(tmp_path.parent / "journal", batch_size=2)
+    assert journal.record(plan) == 5
+
+    # an interrupted run: one rename made but not logged
+    (tmp_path / "File 0.txt").rename(tmp_path / "file-0.txt")
+    resumed = RenameJournal(tmp_path.parent / "journal", batch_size=2)
+    assert resumed.pending() == [0, 1, 2, 3, 4]
+    assert resumed.apply() == 5
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"file-{i}.txt" for i in range(5)]
+    assert RenameJournal(tmp_path.parent / "journal").pending() == []
+
+    reloaded = RenameJournal(tmp_path.parent / "journal")
+    assert reloaded.rollback() == 5
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(names)
+    assert RenameJournal(tmp_path.parent / "journal").pending() == [0, 1, 2, 3, 4]
+
+
+def test_journal_never_clobbers(tmp_path, rename_via):
+    _make_tree(tmp_path, ("a", "b", "c"))
+    (tmp_path / "d").mkdir()
+    journal = RenameJournal(tmp_path / "journal")
+    journal.record([Rename(tmp_path, "a", "x"), Rename(tmp_path, "d", "e"), Rename(tmp_path, "b", "c")])
+    with pytest.raises(FileExistsError):
+        journal.apply()
+    assert (tmp_path / "c").read_text() == "c"
+    assert (tmp_path / "e").is_dir()
+    assert RenameJournal(tmp_path / "journal").pending() == [2]
+
+
+def test_journal_finishes_interrupted_link(tmp_path, rename_via):
+    _make_tree(tmp_path, ("A", "B"))
+    journal = RenameJournal(tmp_path / "journal")
+    journal.record([Rename(tmp_path, "A", "a"), Rename(tmp_path, "B", "b")])
+    # interrupted between linking the target and unlinking the source
+    os.link(tmp_path / "A", tmp_path / "a")
+    assert RenameJournal(tmp_path / "journal").apply() == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a", "b", "journal"]
+    assert (tmp_path / "a").read_text() == "A"
+
+
+def test_journal_torn_line(tmp_path):
+    _make_tree(tmp_path, ("a", "b"))
+    journal = RenameJournal(tmp_path / "journal")
+    journal.record([Rename(tmp_path, "a", "x"), Rename(tmp_path, "b", "y")])
+    # interrupted while logging the first rename done
+    with open(tmp_path / "journal", "a") as fh:
+        fh.write('["D", ')
+    resumed = RenameJournal(tmp_path / "journal")
+    assert resumed.pending() == [0, 1]
+    assert resumed.apply() == 2
+    assert RenameJournal(tmp_path / "journal").pending() == []
+
+
+def test_journal_rollback_unlogged(tmp_path):
+    names = ["A", "B", "C"]
+    _make_tree(tmp_path, names)
+    journal = RenameJournal(tmp_path / "journal")
+    journal.record([Rename(tmp_path, name, name.lower()) for name in names])
+    # an interrupted run: two renames made but not logged
+    (tmp_path / "A").rename(tmp_path / "a")
+    (tmp_path / "B").rename(tmp_path / "b")
+    assert RenameJournal(tmp_path / "journal").rollback() == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["A", "B", "C", "journal"]
+    assert RenameJournal(tmp_path / "journal").pending() == [0, 1, 2]
+
+
+def test_journal_rollback_unlogged_first_batch(tmp_path):
+    names = ["A", "B", "C"]
+    _make_tree(tmp_path, names)
+    journal = RenameJournal(tmp_path / "journal", batch_size=2)
+    journal.record([Rename(tmp_path, name, name.lower()) for name in names])
+    (tmp_path / "A").rename(tmp_path / "a")
+    # outside the batch an interrupted run would have been applying
+    (tmp_path / "C").rename(tmp_path / "c")
+    assert RenameJournal(tmp_path / "journal", batch_size=2).rollback() == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["A", "B", "c", "journal"]
@@ -0,0 +1,81 @@
+from array import array
+from pathlib import Path
+
+import pytest
+
+from horse_dance import results as results_module
+from horse_dance.mime_resolver import MimeResolver, CorrectFormat
+from horse_dance.mime_types import MimeType
+from horse_dance.normalizer import FileName, Normalizer
+from horse_dance.results import ScanResults
+
+_file_examples = Path(__file__).parent / "file-examples"
+
+
+def _scan():
+    resolver, normalizer = MimeResolver(), Normalizer()
+    for path, mimes in resolver.scan(_file_examples):
+        name = None
+        if mimes.resolved is not None:
+            name = normalizer(path, mimes.resolved.mime).normalized_name
+        yield path, mimes, name
+
+
+@pytest.fixture(params=["numpy", "python"])
+def no_numpy(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(results_module, "numpy", None)
+
+
+def test_results_round_trip(tmp_path):
+    expected = list(_scan())
+    results = ScanResults.of_results(expected)
+    assert len(results) == len(expected)
+    assert list(results) == expected
+    assert results[-1] == expected[-1]
+    assert len(results.dirs) < len(results)
+
+    results.save(tmp_path / "results")
+    with ScanResults.load(tmp_path / "results") as loaded:
+        assert list(loaded) == expected
+        assert loaded[0][1].resolved is expected[0][1].resolved
+        assert loaded.info(0).normalized_name == expected[0][2]
+        with pytest.raises(ValueError):
+            loaded.append(*expected[0])
+
+
+def test_results_filters(tmp_path, no_numpy):
+    expected = list(_scan())
+    results = ScanResults.of_results(expected)
+    png = MimeType.of_str("image/png")
+
+    def rows(indices):
+        return [int(i) for i in indices]
+
+    assert rows(results.unresolved()) == [
+        i for i, (_, m, _) in enumerate(expected) if m.resolved is None
+    ]
+    assert rows(results.by_rule(CorrectFormat)) == [
+        i for i, (_, m, _) in enumerate(expected) if isinstance(m.resolved, CorrectFormat)
+    ]
+    assert rows(results.by_mime(png, "file")) == [
+        i for i, (_, m, _) in enumerate(expected) if m.file is png
+    ]
+    assert rows(results.by_mime(MimeType.of_str("x-not/seen"))) == []
+
+    results.save(tmp_path / "results")
+    with ScanResults.load(tmp_path / "results") as loaded:
+        assert rows(loaded.by_mime(png, "file")) == rows(results.by_mime(png, "file"))
+        assert [r[0] for r in loaded.rows(loaded.unresolved())] == [
+            r[0] for r in results.rows(results.unresolved())
+        ]
+
+
+def test_results_names():
+    results = ScanResults()
+    mimes = MimeResolver().resolve_path(Path("a/b.txt"), ignore_file=True)
+    results.append(Path("a/b.txt"), mimes, FileName("b", ""))
+    results.append(Path("\udcff.txt"), mimes)
+    assert results[0] == (Path("a/b.txt"), mimes, FileName("b", ""))
+    assert results[1] == (Path("\udcff.txt"), mimes, None)
+    assert isinstance(results.file, array)
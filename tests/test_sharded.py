@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from horse_dance.mime_types import MimeType
+from horse_dance.mime_resolver import MimeResolver
+from horse_dance.normalizer import Normalizer
+from horse_dance.sharded import scan_sharded, shards
+from horse_dance.scanner import walk
+
+_file_examples = Path(__file__).parent / "file-examples"
+
+_normalizer_config = dict(ambiguous_stems=(dict(stem="sample", suffix_digits=3),))
+
+
+def test_shards_cover_walk_in_order():
+    tasks = shards(_file_examples, 8)
+    assert len(tasks) >= 8
+    paths = [
+        path
+        for rel, recursive in tasks
+        for path, _ in walk(_file_examples / rel, recursive=recursive)
+    ]
+    assert paths == [path for path, _ in walk(_file_examples)]
+
+
+def test_scan_sharded_matches_scan():
+    resolver, normalizer = MimeResolver(), Normalizer(_normalizer_config)
+    expected = []
+    for path, mimes in resolver.scan(_file_examples):
+        name = None
+        if mimes.resolved is not None:
+            name = normalizer(path, mimes.resolved.mime).normalized_name
+        expected.append((path, mimes, name))
+
+    results = list(scan_sharded(
+        _file_examples, normalizer_config=_normalizer_config, workers=2
+    ))
+    assert results == expected
+    assert all(r[1].resolved is e[1].resolved for r, e in zip(results, expected))
+
+
+def test_scan_sharded_name_only():
+    resolver = MimeResolver()
+    results = list(scan_sharded(_file_examples, workers=2, name_only=True))
+    assert [(p, m) for p, m, _ in results] == [
+        (path, resolver.resolve_path(path, ignore_file=True))
+        for path, _ in walk(_file_examples)
+    ]
+    assert all(m.file is MimeType.Unknown for _, m, _ in results)
@@ -0,0 +1,99 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import magic  # type: ignore
+import pytest
+
+from horse_dance.mime_types import MimeType, read_header
+from horse_dance.signatures import HEAD_SIZE, sniff_signature
+
+_tests = Path(__file__).parent
+_sample_media = _tests / "file-examples" / "sample-media"
+
+_expected_hits = (
+    "image/sample.jpg", "image/sample.png", "image/sample.gif", "image/animated.gif",
+    "image/sample.webp", "audio/sample.flac", "audio/sample.ogg",
+    "video/sample.mp4", "video/sample.mov", "video/sample.mkv", "video/sample.webm",
+    "audio/sample.mka", "video/sample.avi", "video/sample.flv", "app/sample.pdf",
+)
+
+
+def test_signatures_agree_with_libmagic():
+    for path in sorted(_tests.rglob("*")):
+        if path.is_file() and not path.is_symlink():
+            mime_str = sniff_signature(read_header(path, HEAD_SIZE))
+            if mime_str is not None:
+                assert mime_str == magic.from_file(str(path), mime=True), path
+
+
+def test_signatures_cover_common_media():
+    for name in _expected_hits:
+        assert sniff_signature(read_header(_sample_media / name, HEAD_SIZE)) is not None, name
+
+
+def test_signatures_agree_with_libmagic_buffers():
+    flac = read_header(_sample_media / "audio" / "sample.flac", HEAD_SIZE)
+    cases = [
+        b"ID3", b"ID3\x04\x00\x00\x00\x00\x00\x0aplain text follows the tag",
+        b"ID3\x04\x00\x00\x00\x00\x00\x00" + flac,
+        b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff",
+    ]
+    for path in sorted(_sample_media.rglob("*")):
+        if path.is_file():
+            head = read_header(path, HEAD_SIZE)
+            cases.extend(head[:end] for end in range(1, len(head) + 1))
+    for data in cases:
+        mime_str = sniff_signature(data)
+        if mime_str is not None:
+            assert mime_str == magic.from_buffer(data, mime=True), data[:16]
+    # an ID3 tag in front of FLAC is left to libmagic
+    assert MimeType.of_buffer(cases[2]) == MimeType.of_str("audio/flac")
+
+
+def test_signatures_truncated_and_noise():
+    webm = read_header(_sample_media / "video" / "sample.webm", HEAD_SIZE)
+    for end in range(len(webm)):
+        assert sniff_signature(webm[:end]) in (None, "video/webm")
+    rand = random.Random(0)
+    for prefix in (b"RIFF", b"FORM", b"\x1aE\xdf\xa3", b"OggS", b""):
+        for _ in range(200):
+            data = prefix + bytes(rand.randrange(256) for _ in range(rand.randrange(64)))
+            sniff_signature(data)
+
+
+def test_of_file_counts_signature_hits():
+    stats = MimeType.sniff_stats
+    stats.reset()
+    paths = [_sample_media / name for name in _expected_hits]
+    paths.append(_sample_media / "text" / "sample.txt")
+    for path in paths:
+        MimeType.of_file(path)
+    assert (stats.signature, stats.libmagic) == (len(_expected_hits), 1)
+    assert stats.hit_rate() == len(_expected_hits) / len(paths)
+
+
+def test_symlinks_are_not_followed(tmp_path):
+    link = tmp_path / "link.jpg"
+    link.symlink_to(_sample_media / "image" / "sample.jpg")
+    assert MimeType.of_file(link) == MimeType.Symlink
+    MimeType.header_size = 1024
+    try:
+        assert MimeType.of_file(link) == MimeType.Symlink
+    finally:
+        MimeType.header_size = None
+    assert MimeType.of_file(link) == MimeType.of_str(magic.from_file(str(link), mime=True))
+
+    dangling = tmp_path / "dangling.jpg"
+    dangling.symlink_to(tmp_path / "missing.jpg")
+    with pytest.raises(FileNotFoundError):
+        MimeType.of_file(dangling)
+
+
+def test_stats_count_across_threads():
+    stats = MimeType.sniff_stats
+    stats.reset()
+    path = _sample_media / "image" / "sample.png"
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: MimeType.of_file(path), range(2000)))
+    assert (stats.signature, stats.libmagic) == (2000, 0)
@@ -0,0 +1,37 @@
+import pickle
+import random
+import string
+
+from slugify import slugify  # type: ignore
+
+from horse_dance.slugs import Slugger, fast_slugify
+
+_corpus = (
+    "", "-", "IMG_0001", "This  is. a file", "--redundant--", "image-05", "a'b",
+    "rock & roll", "&amp;", "&#39;x", "&#x41;", "1,000", "a,b", "Ünïcödé", "日本語",
+    "ﬁle", "Ⅻ", "tab\there", "new\nline", "under_score", "UPPER lower", "x" * 300,
+)
+_alphabet = string.printable + "éüßøæ日本ﬁⅫ’“”–"
+
+
+def test_fast_slugify_matches_corpus():
+    for text in _corpus:
+        assert fast_slugify(text) == slugify(text), text
+
+
+def test_fast_slugify_matches_random():
+    rand = random.Random(0)
+    for _ in range(5000):
+        text = "".join(rand.choice(_alphabet) for _ in range(rand.randint(0, 24)))
+        assert fast_slugify(text) == slugify(text), text
+
+
+def test_slugger_memo():
+    slug = Slugger()
+    assert slug("IMG 0001") == slug("IMG 0001") == "img-0001"
+    info = slug.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+
+    restored = pickle.loads(pickle.dumps(slug))
+    assert restored("IMG 0001") == "img-0001"
+    assert Slugger("slugify", cache_size=0)("a'b") == slugify("a'b")
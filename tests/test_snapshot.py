@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+from pathlib import PurePath
+
+import pytest
+
+from horse_dance.mime_types import MimeType
+from horse_dance.snapshot import Snapshot
+
+_config = dict(
+    mime=dict(
+        preferred_ext=(dict(mime="image/jpeg", ext="jpg"),),
+        ext_optional=("text/plain",),
+        header_size=4096,
+    ),
+    resolver=dict(
+        binary_types=("image",),
+        substitutions=(dict(file="video/abc", name="video/def", resolution="video/xyz"),),
+        cache_size=64,
+    ),
+    normalizer=dict(ambiguous_stems=(dict(stem="img", suffix_digits=4),)),
+)
+
+
+@pytest.fixture
+def restore_mime_type():
+    previous = MimeType.extension_index()
+    yield
+    MimeType.use_index(previous)
+    MimeType.configure({})
+
+
+def test_snapshot_round_trip(tmp_path, restore_mime_type):
+    Snapshot.compile(_config).save(tmp_path / "snapshot")
+    resolver, normalizer = Snapshot.load(tmp_path / "snapshot").install()
+
+    assert MimeType.header_size == 4096
+    assert MimeType.ExtensionOptional == frozenset((MimeType.PlainText,))
+    assert MimeType.of_str("image/jpeg").extension() == "jpg"
+    mimes = resolver.resolve(MimeType.of_str("video/abc"), MimeType.of_str("video/def"))
+    assert mimes.resolved.mime is MimeType.of_str("video/xyz")
+    assert resolver.cache_info().misses == 1
+    name = normalizer(PurePath("a/IMG_0001.jpeg"), MimeType.of_str("image/jpeg")).normalized_name
+    assert str(name) == "img-0001--a.jpg"
+
+
+def test_snapshot_version(tmp_path):
+    (tmp_path / "other").write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        Snapshot.load(tmp_path / "other")
+
+
+def test_heavy_imports_deferred():
+    code = (
+        "import sys\n"
+        "import horse_dance.snapshot, horse_dance.mime_resolver, horse_dance.normalizer\n"
+        "print(sorted({'magic', 'slugify', 'yaml', 'sqlite3'} & set(sys.modules)))\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, stdout=subprocess.PIPE,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    ).stdout
+    assert out.decode().strip() == "[]"
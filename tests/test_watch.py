@@ -0,0 +1,41 @@
+import queue
+import shutil
+from pathlib import Path
+
+from horse_dance.mime_types import MimeType
+from horse_dance.watch import Watcher
+
+_mime_file_cases = Path(__file__).parent / "mime_file_cases"
+
+
+def _collect(results, count, timeout=5.0):
+    return sorted((results.get(timeout=timeout) for _ in range(count)), key=lambda r: r.path)
+
+
+def test_watch(tmp_path):
+    drop = tmp_path / "drop"
+    drop.mkdir()
+    (drop / "already-there.txt").write_text("not reported")
+    staging = tmp_path / "staging"
+    staging.mkdir()
+    results: "queue.Queue" = queue.Queue()
+
+    with Watcher(drop, results.put, settle=0.01, workers=2):
+        shutil.copy(_mime_file_cases / "sample.jpg", drop / "Holiday Photo.JPG")
+        shutil.copy(_mime_file_cases / "sample.mp3", staging / "song.mp3")
+        (staging / "song.mp3").rename(drop / "song.mp3")
+        (staging / "batch").mkdir()
+        shutil.copy(_mime_file_cases / "sample.pdf", staging / "batch" / "report.pdf")
+        (staging / "batch").rename(drop / "batch")
+        (drop / "batch" / "notes").mkdir()
+        (drop / "batch" / "notes" / "todo.txt").write_text("remember\n")
+
+        landed = _collect(results, 4)
+
+    assert [r.path.relative_to(drop).as_posix() for r in landed] == [
+        "Holiday Photo.JPG", "batch/notes/todo.txt", "batch/report.pdf", "song.mp3"
+    ]
+    assert landed[0].mimes.file == MimeType.of_str("image/jpeg")
+    assert landed[0].info.normalized_name.stem == "holiday-photo"
+    assert landed[3].mimes.resolved.mime == MimeType.of_str("audio/mpeg")
+    assert results.empty()